@@ -0,0 +1,452 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: batch.py
+#  generates trees from a list of specs, with or without Blender
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Generate trees from a list of specs and write them to files, with a timing report per tree.
+
+A spec is a dict of SCATree operator properties (for example {"numberOfEndpoints": 500, "randomSeed": 3}),
+plus optionally a "name" for its files and a "preset": an operator preset file, or inside Blender the name of
+one, whose properties the spec overrides. A spec file is a JSON list of specs (or a single spec), or an
+operator preset file, which is a spec by itself.
+
+As a plain python module the skeletons are grown by the growth engine alone and can be written as skeleton
+caches (sca) and ply, obj or glb files (see export.py). Crowns defined by object groups need Blender then:
+
+    python -m add_mesh_space_tree.batch specs.json --workers 4 --format sca glb -o trees --report report.json
+
+Inside Blender every spec is run through the operator itself, so .blend files can be written as well. Meshes
+can only be created on Blender's main thread, so with --workers the skeletons are grown in worker processes
+run by Blender's python interpreter (or in the generation service of service.py if one is running) while the
+main thread builds the meshes of the trees grown before them. At most --queue skeletons are growing or waiting
+to be built at any time. With --blenders, or with --workers when Blender comes without a python interpreter,
+the specs are spread over separate background Blenders that open the same .blend file:
+
+    blender -b scene.blend --python add_mesh_space_tree/batch.py -- specs.json --workers 4 --format blend
+    blender -b scene.blend --python add_mesh_space_tree/batch.py -- specs.json --blenders 4 --format blend
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import deque
+from functools import partial
+from multiprocessing import Pool, cpu_count, get_context
+from time import perf_counter
+
+if not __package__:
+    # run as a script (blender --python batch.py, or as the main module of a spawned worker of PoolGrower),
+    # so import the add-on as a package to make the imports below work
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import add_mesh_space_tree
+    __package__ = 'add_mesh_space_tree'
+
+from . import bpy
+from .mathutils_shim import install
+install()
+
+from mathutils import Vector
+
+from .bench import environment
+from .export import Skeleton, export
+from .scanew import SCA, ellipsoid2
+from .service import connect
+
+FORMATS = ('sca', 'ply', 'obj', 'glb', 'blend')
+
+PRESETS = 'operator/mesh.sca_tree'
+
+# the defaults of the operator properties that the growth (and the skin of export()) depends on, used outside Blender
+DEFAULTS = {
+    'internodeLength': 0.75,
+    'killDistance': 3.0,
+    'influenceRange': 15.0,
+    'tropism': 0.0,
+    'power': 0.3,
+    'scale': 0.01,
+    'useGroups': False,
+    'useTrunkGroup': False,
+    'crownSize': 5.0,
+    'crownShape': 1.0,
+    'crownOffset': 3.0,
+    'surfaceBias': 1.0,
+    'topBias': 1.0,
+    'randomSeed': 0,
+    'maxIterations': 40,
+    'numberOfEndpoints': 100,
+    'newEndPointsPer1000': 0,
+    'maxTime': 0.0,
+    'stallGenerations': 0,
+    'apicalcontrol': 0.0,
+    'apicalcontrolfalloff': 1.0,
+    'apicalcontroltiming': 10,
+    }
+
+def readpreset(filename):
+    """return the properties a Blender operator preset file sets, without running it."""
+    with open(filename) as f:
+        module = ast.parse(f.read(), filename)
+    properties = {}
+    for statement in module.body:
+        # every property is set by a line like: op.internodeLength = 0.75
+        if not isinstance(statement, ast.Assign) or len(statement.targets) != 1 : continue
+        target = statement.targets[0]
+        if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == 'op':
+            properties[target.attr] = ast.literal_eval(statement.value)
+    return properties
+
+def findpreset(name, directory):
+    """return the path of a preset given as a path (relative to directory) or, inside Blender, by name."""
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return path
+    if bpy is not None:
+        for presets in bpy.utils.preset_paths(PRESETS):
+            path = os.path.join(presets, name if name.endswith('.py') else bpy.path.clean_name(name)+'.py')
+            if os.path.exists(path):
+                return path
+    raise ValueError("preset '%s' not found"%name)
+
+def readspecs(filename):
+    """return the list of specs in a spec or preset file, with their presets resolved and a name for each."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    base = os.path.splitext(os.path.basename(filename))[0]
+    if filename.endswith('.py'):
+        specs = [{'preset': os.path.basename(filename)}]
+    else:
+        with open(filename) as f:
+            specs = json.load(f)
+        if isinstance(specs, dict):
+            specs = [specs]
+    resolved = []
+    for n, spec in enumerate(specs):
+        properties = {'name': base if len(specs) == 1 else '%s%03d'%(base, n)}
+        if 'preset' in spec:
+            properties.update(readpreset(findpreset(spec['preset'], directory)))
+        properties.update((k, v) for k, v in spec.items() if k != 'preset')
+        resolved.append(properties)
+    return resolved
+
+def grow(spec):
+    """grow the skeleton described by the operator properties in spec with the growth engine alone and return the SCA."""
+    p = dict(DEFAULTS)
+    p.update(spec)
+    for group in ('useGroups', 'useTrunkGroup'):
+        if p[group]:
+            raise ValueError("%s needs Blender, run the batch with blender -b --python"%group)
+    sca = SCA(NBP = p['maxIterations'],
+        NENDPOINTS=p['numberOfEndpoints'],
+        d=p['internodeLength'],
+        KILLDIST=p['killDistance'],
+        INFLUENCE=p['influenceRange'],
+        SEED=p['randomSeed'],
+        TROPISM=p['tropism'],
+        volume=partial(ellipsoid2, p['crownSize']*p['crownShape'], p['crownSize'],
+            Vector((0, 0, p['crownSize']+p['crownOffset'])), p['surfaceBias'], p['topBias']),
+        apicalcontrol=p['apicalcontrol'],
+        apicalcontrolfalloff=p['apicalcontrolfalloff'],
+        apicaltiming=p['apicalcontroltiming'])
+    sca.iterate(newendpointsper1000=p['newEndPointsPer1000'], maxtime=p['maxTime'], patience=p['stallGenerations'])
+    return sca
+
+def needsblender(spec):
+    """
+    return True if spec has to be grown by the operator itself: when its crown, trunks or exclusion are defined
+    by objects in the scene, or when its markers are shown, as a Skeleton grown elsewhere does not keep them.
+    """
+    return bool(spec.get('useGroups') or spec.get('useTrunkGroup') or spec.get('exclusionGroup', 'None') != 'None'
+        or spec.get('showMarkers'))
+
+def growskeleton(spec):
+    """grow the skeleton of spec in a worker process and return it as a Skeleton, with the seconds it took."""
+    start = perf_counter()
+    skeleton = Skeleton(grow(spec))
+    skeleton.seconds = perf_counter() - start
+    return skeleton
+
+def pythonexecutable():
+    """return the plain python interpreter that comes with Blender, or None if there is none."""
+    blender = bpy.app.binary_path
+    for executable in (getattr(bpy.app, 'binary_path_python', None), sys.executable): # the former before Blender 2.91
+        if executable and os.path.isfile(executable) and not (blender and os.path.samefile(executable, blender)):
+            return executable
+    return None
+
+class PoolGrower:
+    """
+    grows skeletons in a pool of worker processes. result() returns them in the order the specs were submitted.
+    Inside Blender the workers have to be started with executable, a plain python interpreter: forking Blender's
+    threads is not safe, and spawning would start Blender itself.
+    """
+
+    def __init__(self, workers, executable=None):
+        if executable is None:
+            self.pool = Pool(workers)
+        else:
+            context = get_context('spawn')
+            context.set_executable(executable)
+            self.pool = context.Pool(workers)
+        self.pending = deque()
+
+    def submit(self, spec):
+        # by the name of this module in the package, which the workers can import even when this runs as a script
+        from .batch import growskeleton
+        self.pending.append(self.pool.apply_async(growskeleton, (spec,)))
+
+    def result(self):
+        return self.pending.popleft().get()
+
+    def close(self):
+        self.pool.terminate()
+
+class ServiceGrower:
+    """
+    grows skeletons in the generation service (see service.py). The service answers the requests of a connection
+    one at a time, so the specs are spread over a connection per worker of the service.
+    """
+
+    def __init__(self, client):
+        self.clients = [client]
+        for i in range(client.status()['workers'] - 1):
+            client = connect()
+            if client is not None:
+                self.clients.append(client)
+        self.pending = deque()
+        self.submitted = 0
+
+    def submit(self, spec):
+        client = self.clients[self.submitted % len(self.clients)]
+        client.submit(spec)
+        self.pending.append(client)
+        self.submitted += 1
+
+    def result(self):
+        return self.pending.popleft().result()
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+def pipeline(specs, grower, queue, build):
+    """
+    return the results of build(spec, skeleton, started) for every spec, in order. The skeletons of the specs that
+    do not need Blender are grown by grower (see PoolGrower) while the previous ones are built, with at most queue
+    of them submitted but not yet built, and started is the perf_counter() at which the spec was submitted. The
+    other specs are built with skeleton and started None, and the error of a failed growth is passed instead of
+    a skeleton.
+    """
+    remote = [n for n, spec in enumerate(specs) if not needsblender(spec)]
+    submitted = built = 0 # counts of the remote specs
+    started = deque()
+    results = []
+    for n, spec in enumerate(specs):
+        while submitted < len(remote) and submitted - built < queue:
+            started.append(perf_counter())
+            grower.submit(specs[remote[submitted]])
+            submitted += 1
+        skeleton = start = None
+        if built < len(remote) and remote[built] == n:
+            start = started.popleft()
+            try:
+                skeleton = grower.result()
+            except Exception as e:
+                skeleton = e
+            built += 1
+        results.append(build(spec, skeleton, start))
+    return results
+
+def operatortree(spec, skeleton=None):
+    """
+    run the SCATree operator with the properties in spec and return the SCA it grew (or if a skeleton grown
+    elsewhere is given, used) and the objects it added.
+    """
+    from .scatree import lastgrowth, pregrown
+    scene = bpy.context.scene
+    before = set(scene.objects)
+    properties = {k:v for k,v in spec.items() if k != 'name'}
+    properties['updateTree'] = True
+    if skeleton is not None:
+        pregrown['sca'] = skeleton
+    try:
+        bpy.ops.mesh.sca_tree(**properties)
+    finally:
+        pregrown.clear()
+    return lastgrowth['sca'], [ob for ob in scene.objects if ob not in before]
+
+def removeobjects(objects):
+    """remove the objects (and their meshes) that a tree added, so the next one starts from the same scene."""
+    scene = bpy.context.scene
+    for ob in objects:
+        data = ob.data
+        scene.objects.unlink(ob)
+        bpy.data.objects.remove(ob)
+        if isinstance(data, bpy.types.Mesh) and data.users == 0:
+            bpy.data.meshes.remove(data)
+
+def runspec(spec, outdir, formats, skeleton=False, grown=None, started=None):
+    """
+    generate the tree described by spec, write it in each of the formats and return its timing report.
+    If a Skeleton grown elsewhere is passed as grown only the tree objects are built from it, and the time spent
+    in the operator is reported as 'build' instead of 'grow'. If grown is an exception it is reported as the error.
+    The 'total' is the wall time from started (the perf_counter() at which the growth of grown was submitted, by
+    default now) until the files are written. Growing and building overlap in a pipeline, so it can be less than
+    the sum of the other timings.
+    """
+    if started is None:
+        started = perf_counter()
+    result = {'name': spec['name'], 'process': os.getpid(), 'seconds': {}, 'files': []}
+    seconds = result['seconds']
+    objects = []
+    try:
+        if isinstance(grown, Exception):
+            raise grown
+        if grown is not None:
+            seconds['grow'] = grown.seconds
+        start = perf_counter()
+        if bpy is None:
+            if 'blend' in formats:
+                raise ValueError("writing .blend files needs Blender")
+            sca = grown or grow(spec)
+        else:
+            sca, objects = operatortree(spec, grown)
+        seconds['build' if grown is not None else 'grow'] = perf_counter() - start
+        result.update(generations=sca.generations, stopreason=sca.stopreason, branchpoints=len(sca.bp)//3)
+        for fmt in formats:
+            filename = os.path.join(outdir, '%s.%s'%(spec['name'], fmt))
+            start = perf_counter()
+            if fmt == 'blend':
+                bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(filename), copy=True)
+            else:
+                export(sca, filename, skeleton, spec.get('power', DEFAULTS['power']), spec.get('scale', DEFAULTS['scale']))
+            seconds[fmt] = perf_counter() - start
+            result['files'].append(filename)
+    except Exception as e:
+        result['error'] = "%s: %s"%(type(e).__name__, e)
+    finally:
+        if objects:
+            removeobjects(objects)
+    seconds['total'] = perf_counter() - started
+    return result
+
+def blenderworkers(argv, workers, specs):
+    """run the specs spread over workers background Blender processes and return their reports in spec order."""
+    parts = []
+    processes = []
+    for k in range(workers):
+        fd, part = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        parts.append(part)
+        command = [bpy.app.binary_path, '-b']
+        if bpy.data.filepath:
+            command.append(bpy.data.filepath)
+        command += ['--python', os.path.abspath(__file__), '--'] + argv + ['--blenders', '1', '--shard', str(k), str(workers), '--report', part]
+        processes.append(subprocess.Popen(command))
+    reports = []
+    for process, part in zip(processes, parts):
+        process.wait()
+        try:
+            with open(part) as f:
+                reports.append(json.load(f)['trees'])
+        except ValueError:
+            reports.append([])
+        os.remove(part)
+    # shard k holds specs k, k+workers, ...
+    ordered = [None]*len(specs)
+    for k, report in enumerate(reports):
+        for n, result in zip(range(k, len(specs), workers), report):
+            ordered[n] = result
+    return [result if result is not None else {'name': spec['name'], 'error': 'worker failed'}
+        for spec, result in zip(specs, ordered)]
+
+def main(argv=None):
+    if argv is None:
+        # blender passes the arguments of the script after a -- (later ones win, which blenderworkers() relies on)
+        argv = sys.argv[sys.argv.index('--')+1:] if bpy is not None and '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(prog='python -m add_mesh_space_tree.batch', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('specs', nargs='+', help='JSON spec files and/or operator preset files')
+    parser.add_argument('-o', '--output', default='.', help='directory to write the files to')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['blend'] if bpy is not None else ['sca'],
+        help='the files to write for every tree')
+    parser.add_argument('--skeleton', action='store_true', help='write the skeleton instead of the skin to ply, obj and glb files')
+    parser.add_argument('--workers', type=int, default=1, help='the number of trees grown in parallel (0 = one per cpu)')
+    parser.add_argument('--queue', type=int, default=0,
+        help='inside Blender the maximum number of skeletons growing or waiting to be built (0 = workers + 1)')
+    parser.add_argument('--blenders', type=int, default=1, help='inside Blender the number of background Blenders to spread the specs over')
+    parser.add_argument('--report', help='write the JSON timing report to this file instead of stdout')
+    parser.add_argument('--shard', type=int, nargs=2, metavar=('K','N'), help=argparse.SUPPRESS) # used by blenderworkers()
+    args = parser.parse_args(argv)
+
+    if bpy is not None and not hasattr(bpy.types, 'MESH_OT_sca_tree'):
+        # the add-on is not enabled in this Blender
+        from . import register
+        register()
+
+    specs = [spec for filename in args.specs for spec in readspecs(filename)]
+    if args.shard:
+        specs = specs[args.shard[0]::args.shard[1]]
+    workers = min(args.workers or cpu_count(), max(len(specs), 1))
+    os.makedirs(args.output, exist_ok=True)
+
+    start = perf_counter()
+    run = partial(runspec, outdir=args.output, formats=args.format, skeleton=args.skeleton)
+    if args.blenders > 1 and bpy is not None:
+        trees = blenderworkers(argv, min(args.blenders, max(len(specs), 1)), specs)
+    elif workers > 1 and bpy is not None:
+        client = connect()
+        executable = pythonexecutable()
+        if client is None and executable is None:
+            # nothing to grow the skeletons in but Blender itself, so run the specs in background Blenders instead
+            trees = blenderworkers(argv + ['--workers', '1'], workers, specs)
+        else:
+            grower = ServiceGrower(client) if client is not None else PoolGrower(workers, executable)
+            try:
+                trees = pipeline(specs, grower, args.queue or workers + 1, lambda spec, skeleton, started: run(spec, grown=skeleton, started=started))
+            finally:
+                grower.close()
+    elif workers > 1:
+        with Pool(workers) as pool:
+            trees = pool.map(run, specs, chunksize=1)
+    else:
+        trees = [run(spec) for spec in specs]
+    results = {'environment': environment(), 'workers': workers, 'seconds': perf_counter() - start, 'trees': trees}
+
+    for tree in trees:
+        if 'error' in tree:
+            print("%s: %s"%(tree['name'], tree['error']), file=sys.stderr)
+        else:
+            steps = ', '.join("%s %.3fs"%(step, t) for step, t in sorted(tree['seconds'].items()) if step != 'total')
+            print("%s: %.3fs (%s) %d branchpoints"%(tree['name'], tree['seconds']['total'], steps, tree['branchpoints']), file=sys.stderr)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+    return 1 if any('error' in tree for tree in trees) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
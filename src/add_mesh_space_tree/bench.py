@@ -0,0 +1,185 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: bench.py
+#  a benchmark for the space colonization growth engine that runs without Blender
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Benchmark the space colonization growth engine (scanew.py) outside Blender.
+
+Every combination of the swept parameters is grown and the time spent in each phase
+(addEndPoint, growBranches, addBranchPoint and buildResults) plus the peak memory use is recorded.
+Note that growBranches includes the time spent in the addBranchPoint calls it makes.
+
+Run it from the directory that contains the add_mesh_space_tree package, for example:
+
+    python -m add_mesh_space_tree.bench --endpoints 1000 5000 --apicalcontrol 0 0.3 -o new.json
+    python -m add_mesh_space_tree.bench --compare old.json new.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from functools import partial
+from itertools import product
+from time import perf_counter
+
+from .mathutils_shim import install
+install()
+
+from mathutils import Vector
+
+from . import bl_info
+from .kernels import getbackend
+from .scanew import SCA, sphere
+
+PHASES = ('addEndPoint', 'growBranches', 'addBranchPoint', 'buildResults')
+
+# the swept parameters, with their command line defaults (the operator defaults where they make sense)
+SWEEP = (
+    ('endpoints',     int,   [1000]),
+    ('iterations',    int,   [40]),
+    ('internode',     float, [0.75]),
+    ('influence',     float, [15.0]),
+    ('killdistance',  float, [3.0]),
+    ('apicalcontrol', float, [0.0]),
+    ('newendpoints',  int,   [0]),
+    ('crownsize',     float, [5.0]),
+    ('seed',          int,   [0]),
+    ('lowmemory',     int,   [0]),
+    ('backend',       str,   ['auto']),
+    )
+
+def timed(phase, method):
+    """wrap an SCA method so that the time spent in it is accumulated in self.phases[phase]."""
+    def wrapper(self, *args):
+        start = perf_counter()
+        result = method(self, *args)
+        acc = self.phases[phase]
+        acc[0] += perf_counter() - start
+        acc[1] += 1
+        return result
+    return wrapper
+
+class TimedSCA(SCA):
+    """an SCA that records the time spent in, and the number of calls of, each phase."""
+
+    def __init__(self, *args, **kwargs):
+        self.phases = {phase:[0.0, 0] for phase in PHASES}
+        SCA.__init__(self, *args, **kwargs)
+
+    addEndPoint = timed('addEndPoint', SCA.addEndPoint)
+    growBranches = timed('growBranches', SCA.growBranches)
+    addBranchPoint = timed('addBranchPoint', SCA.addBranchPoint)
+    buildResults = timed('buildResults', SCA.buildResults)
+
+def grow(cls, case):
+    crown = case['crownsize']
+    sca = cls(NENDPOINTS=case['endpoints'],
+        NBP=case['iterations'],
+        d=case['internode'],
+        KILLDIST=case['killdistance'],
+        INFLUENCE=case['influence'],
+        SEED=case['seed'],
+        volume=partial(sphere, crown, Vector((0, 0, 2*crown))),
+        apicalcontrol=case['apicalcontrol'],
+        lowmemory=bool(case['lowmemory']),
+        backend=case['backend'])
+    sca.iterate(newendpointsper1000=case['newendpoints'])
+    return sca
+
+def runcase(case, repeat=1, memory=True):
+    """grow the tree described by case and return a dict with timings, counts and peak memory use."""
+    best = None
+    for r in range(repeat):
+        start = perf_counter()
+        sca = grow(TimedSCA, case)
+        total = perf_counter() - start
+        if best is None or total < best['total']:
+            best = {'total':total,
+                'phases':{phase:{'seconds':t, 'calls':n} for phase,(t,n) in sca.phases.items()},
+                'generations':sca.generations,
+                'stopreason':sca.stopreason,
+                'branchpoints':len(sca.branchpoints),
+                'endpoints':len(sca.endpoints)}
+    best['params'] = case
+    if memory:
+        # tracing allocations slows things down considerably, so measure memory in a separate, untimed run
+        tracemalloc.start()
+        grow(SCA, case)
+        best['peakmemory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best
+
+def environment():
+    return {'addon':'.'.join(str(v) for v in bl_info['version']),
+        'python':platform.python_version(),
+        'implementation':platform.python_implementation(),
+        'machine':platform.machine(),
+        'platform':platform.platform(),
+        'backend':getbackend().name}
+
+def casekey(case):
+    return tuple(sorted(case['params'].items()))
+
+def compare(old, new, out=sys.stdout):
+    """print the ratio of the total times of the cases common to two benchmark results."""
+    oldcases = {casekey(c):c for c in old['cases']}
+    for c in new['cases']:
+        o = oldcases.get(casekey(c))
+        if o is None: continue
+        label = " ".join("%s=%s"%(k,v) for k,v in sorted(c['params'].items()))
+        print("%-100s %8.3fs %8.3fs %6.2fx"%(label, o['total'], c['total'], o['total']/c['total'] if c['total'] > 0 else 0), file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m add_mesh_space_tree.bench', description=__doc__.split('\n\n')[0].strip())
+    for name, kind, default in SWEEP:
+        parser.add_argument('--'+name, type=kind, nargs='+', default=default, metavar=name[0].upper())
+    parser.add_argument('--repeat', type=int, default=1, help='grow each case this many times and keep the fastest run')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the (slow) peak memory measurement')
+    parser.add_argument('-o', '--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD','NEW'), help='compare two earlier results and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    names = [name for name,kind,default in SWEEP]
+    results = {'environment':environment(), 'cases':[]}
+    for values in product(*(getattr(args, name) for name in names)):
+        case = dict(zip(names, values))
+        result = runcase(case, args.repeat, args.memory)
+        results['cases'].append(result)
+        print("%s: %.3fs %d branchpoints"%(" ".join("%s=%s"%kv for kv in zip(names, values)),
+            result['total'], result['branchpoints']), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+
+if __name__ == "__main__":
+    main()
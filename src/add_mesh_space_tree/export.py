@@ -0,0 +1,253 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: export.py
+#  writes grown trees to PLY, OBJ and glTF binary files without Blender
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Export the skeleton of a grown SCA, or the mesh the native skinning method creates from it, without Blender.
+
+The geometry is computed directly from the flat arrays of the SCA object (no Branchpoint objects or Vectors are
+needed) into array.array()s which are written to the file in bulk:
+
+    from add_mesh_space_tree.export import export
+    export(sca, 'tree.glb')                   # the skinned tree
+    export(sca, 'tree.ply', skeleton=True)    # the skeleton as edges, with the radius of every vertex
+
+PLY and OBJ files use Blender's coordinates (z up), glTF files are converted to the y up convention of glTF.
+A .sca file is a skeleton cache: the pickled Skeleton of the tree, which loadskeleton() reads back and which
+can be exported like the SCA it came from.
+"""
+
+import json
+import pickle
+import struct
+import sys
+from array import array
+
+class Skeleton:
+    """the arrays of a grown SCA that describe its skeleton, without the endpoints and the growth machinery."""
+
+    def __init__(self, sca):
+        self.bp = array('d', sca.bp)
+        self.bpp = list(sca.bpp)
+        self.bpg = list(sca.bpg)
+        self.bpt = array('i', sca.bpt)
+        self.ntrees = sca.ntrees
+        self.generations = sca.generations
+        self.stopreason = sca.stopreason
+
+    def buildResults(self):
+        """create the list of Branchpoint objects that createGeometry() in scatree.py works with."""
+        from .scanew import branchpoints
+        self.branchpoints = branchpoints(self.bp, self.bpp, self.bpg, self.bpt)
+
+def saveskeleton(sca, filename):
+    with open(filename, 'wb') as f:
+        pickle.dump(Skeleton(sca), f, pickle.HIGHEST_PROTOCOL)
+
+def loadskeleton(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def connections(sca):
+    """return an array with for every branchpoint 1 plus its number of descendants (Branchpoint.connections)."""
+    n = len(sca.bp)//3
+    conn = array('i', [1])*n
+    bpp = sca.bpp
+    for bi in range(n-1, -1, -1): # children always have a higher index than their parent
+        pi = bpp[bi]
+        if pi is not None:
+            conn[pi] += conn[bi]
+    return conn
+
+def selection(sca, treeindex=None):
+    """return the indices of the branchpoints of tree treeindex (all if None) and a map from index to position in that list."""
+    n = len(sca.bp)//3
+    keep = array('i', (bi for bi in range(n) if treeindex is None or sca.bpt[bi] == treeindex))
+    position = array('i', [-1])*n
+    for i,bi in enumerate(keep):
+        position[bi] = i
+    return keep, position
+
+def skeletonmesh(sca, treeindex=None):
+    """return the positions (flat x,y,z), the edges (flat pairs of vertex indices) and the connections of the skeleton."""
+    keep, position = selection(sca, treeindex)
+    conn = connections(sca)
+    bp, bpp = sca.bp, sca.bpp
+    positions = array('f', (c for bi in keep for c in bp[bi*3:bi*3+3]))
+    edges = array('i')
+    for i,bi in enumerate(keep):
+        if bpp[bi] is not None:
+            edges.append(i)
+            edges.append(position[bpp[bi]])
+    return positions, edges, array('i', (conn[bi] for bi in keep))
+
+def skinmesh(sca, power=0.5, scale=0.01, treeindex=None):
+    """
+    return the positions (flat x,y,z) and quads (flat groups of four vertex indices) of the mesh that the native
+    skinning method of createGeometry() creates: a triangle with radius connections**power*scale around every
+    branchpoint, connected to the triangle of its parent by three quads.
+    """
+    keep, position = selection(sca, treeindex)
+    conn = connections(sca)
+    bp, bpp = sca.bp, sca.bpp
+    positions = array('f', [0.0])*(len(keep)*9)
+    quads = array('i')
+    for i,bi in enumerate(keep):
+        x, y, z = bp[bi*3:bi*3+3]
+        r = (conn[bi]**power)*scale
+        b = r*0.5   # cos(60)
+        c = r*0.866 # sin(60)
+        positions[i*9:i*9+9] = array('f', (x-r, y, z, x+b, y-c, z, x+b, y+c, z))
+        if bpp[bi] is not None:
+            p = position[bpp[bi]]*3
+            n = i*3
+            quads.extend((p, p+1, n+1, n, p+1, p+2, n+2, n+1, p+2, p, n, n+2))
+    return positions, quads
+
+def littleendian(a):
+    """return the bytes of array a in little endian order."""
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+def writeply(f, positions, edges=None, quads=None, radii=None):
+    """write a binary PLY file to the binary file object f."""
+    nv = len(positions)//3
+    header = ["ply", "format binary_little_endian 1.0", "comment SCA Tree Generator",
+        "element vertex %d"%nv, "property float x", "property float y", "property float z"]
+    if radii is not None:
+        header.append("property int radius")
+    if edges is not None:
+        header.extend(["element edge %d"%(len(edges)//2), "property int vertex1", "property int vertex2"])
+    if quads is not None:
+        header.extend(["element face %d"%(len(quads)//4), "property list uchar int vertex_indices"])
+    header.append("end_header\n")
+    f.write("\n".join(header).encode('ascii'))
+    if radii is None:
+        f.write(littleendian(positions))
+    else:
+        vertex = struct.Struct('<fffi')
+        record = bytearray(vertex.size*nv)
+        for i in range(nv):
+            vertex.pack_into(record, i*vertex.size, positions[i*3], positions[i*3+1], positions[i*3+2], radii[i])
+        f.write(record)
+    if edges is not None:
+        f.write(littleendian(edges))
+    if quads is not None:
+        face = struct.Struct('<B4i')
+        record = bytearray(face.size*(len(quads)//4))
+        for i in range(len(quads)//4):
+            face.pack_into(record, i*face.size, 4, *quads[i*4:i*4+4])
+        f.write(record)
+
+def writeobj(f, positions, edges=None, quads=None):
+    """write a Wavefront OBJ file to the text file object f."""
+    f.write("# SCA Tree Generator\n")
+    for i in range(0, len(positions), 3):
+        f.write("v %.6f %.6f %.6f\n"%(positions[i], positions[i+1], positions[i+2]))
+    if edges is not None:
+        for i in range(0, len(edges), 2):
+            f.write("l %d %d\n"%(edges[i]+1, edges[i+1]+1))
+    if quads is not None:
+        for i in range(0, len(quads), 4):
+            f.write("f %d %d %d %d\n"%(quads[i]+1, quads[i+1]+1, quads[i+2]+1, quads[i+3]+1))
+
+def writeglb(f, positions, edges=None, quads=None):
+    """
+    write a glTF 2.0 binary file with a single mesh (lines for edges, triangles for quads) to the binary file object f.
+    Without any edges or quads, e.g. for a tree that did not grow, the vertices are written as points.
+    """
+    nv = len(positions)//3
+    if nv == 0:
+        raise ValueError("nothing to export, the tree has no branchpoints")
+    # glTF is y up: (x, y, z) -> (x, z, -y)
+    yup = array('f', positions)
+    yup[1::3], yup[2::3] = array('f', positions[2::3]), array('f', (-y for y in positions[1::3]))
+    if quads:
+        indices = array('I', (q for i in range(0, len(quads), 4)
+            for q in (quads[i], quads[i+1], quads[i+2], quads[i], quads[i+2], quads[i+3])))
+        mode = 4 # TRIANGLES
+    elif edges:
+        indices = array('I', edges)
+        mode = 1 # LINES
+    else:
+        # glTF does not allow empty accessors, so no indices at all
+        indices = None
+        mode = 0 # POINTS
+    vertexbytes = littleendian(yup)
+    binary = vertexbytes
+    primitive = {'attributes': {'POSITION': 0}, 'mode': mode}
+    bufferviews = [{'buffer': 0, 'byteOffset': 0, 'byteLength': len(vertexbytes), 'target': 34962}]
+    accessors = [{'bufferView': 0, 'componentType': 5126, 'count': nv, 'type': 'VEC3',
+        'min': [min(yup[k::3]) for k in range(3)],
+        'max': [max(yup[k::3]) for k in range(3)]}]
+    if indices is not None:
+        indexbytes = littleendian(indices)
+        binary += indexbytes + b'\0'*(-len(indexbytes) % 4)
+        primitive['indices'] = 1
+        bufferviews.append({'buffer': 0, 'byteOffset': len(vertexbytes), 'byteLength': len(indexbytes), 'target': 34963})
+        accessors.append({'bufferView': 1, 'componentType': 5125, 'count': len(indices), 'type': 'SCALAR'})
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'SCA Tree Generator'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'name': 'Tree'}],
+        'meshes': [{'name': 'Tree', 'primitives': [primitive]}],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': bufferviews,
+        'accessors': accessors,
+        }
+    text = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    text += b' '*(-len(text) % 4)
+    f.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(text) + 8 + len(binary)))
+    f.write(struct.pack('<I4s', len(text), b'JSON'))
+    f.write(text)
+    f.write(struct.pack('<I4s', len(binary), b'BIN\0'))
+    f.write(binary)
+
+def export(sca, filename, skeleton=False, power=0.5, scale=0.01, treeindex=None):
+    """
+    write the skinned tree (or if skeleton is True the skeleton) of a grown SCA to filename.
+    The format follows from the extension: .ply, .obj, .glb or .sca (a skeleton cache).
+    """
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension == 'sca':
+        saveskeleton(sca, filename)
+        return
+    edges = quads = radii = None
+    if skeleton:
+        positions, edges, radii = skeletonmesh(sca, treeindex)
+    else:
+        positions, quads = skinmesh(sca, power, scale, treeindex)
+    if extension == 'ply':
+        with open(filename, 'wb') as f:
+            writeply(f, positions, edges, quads, radii)
+    elif extension == 'obj':
+        with open(filename, 'w') as f:
+            writeobj(f, positions, edges, quads)
+    elif extension == 'glb':
+        with open(filename, 'wb') as f:
+            writeglb(f, positions, edges, quads)
+    else:
+        raise ValueError("unknown export format '%s', use .ply, .obj, .glb or .sca"%extension)
@@ -0,0 +1,239 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: kernels.py
+#  the inner loops of the growth engine in plain python, compiled with numba if it is available
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+The hot loops of scanew.py and the registry of backends that implement them.
+
+All kernels work directly on the flat array.array()s of the SCA class (numba accepts anything that supports
+the buffer protocol) and only use scalars and tuples otherwise, so numba can compile the plain python source
+below in nopython mode. closest() and direction() have the same signature as their counterparts in the utilc
+extension. The available backends are:
+
+    utilc   the C extension for closest() and direction(), python for updateendpoints()
+    numba   the functions in this module, compiled with numba
+    numpy   the functions in npkernels.py
+    python  the functions in this module, interpreted
+
+getbackend() returns the backend asked for, the one named in the SPACETREE_BACKEND environment variable or
+else the first available one in the order above. report() shows which backends are available on this machine
+and how fast their kernels are:
+
+    python -m add_mesh_space_tree.kernels
+"""
+
+import json
+import os
+from collections import OrderedDict
+from array import array
+from math import sqrt
+from random import Random
+from time import perf_counter
+
+def closest(pos, count, n, x, y, z):
+    """return the squared distance, the index and the vector to the closest of the n positions with a count < 2."""
+    d2 = 1e30
+    ci = -1
+    v = 0.0, 0.0, 0.0
+    for i in range(n):
+        if count[i] > 1 : continue
+        dx, dy, dz = x-pos[i*3], y-pos[i*3+1], z-pos[i*3+2]
+        d = dx*dx + dy*dy + dz*dz
+        if d < d2:
+            d2 = d
+            ci = i
+            v = dx, dy, dz
+    return d2, ci, v
+
+def direction(v):
+    """return the sum of the flat x,y,z vectors in v and its squared length."""
+    n = len(v)//3
+    x = 0.0
+    y = 0.0
+    z = 0.0
+    for i in range(n):
+        x += v[i*3  ]
+        y += v[i*3+1]
+        z += v[i*3+2]
+    return (x,y,z),x*x+y*y+z*z
+
+def updateendpoints(ep, epv, epd, epb, x, y, z, bi, killdistance, influence):
+    """
+    update the endpoints for a new branchpoint bi at x,y,z and return the number of endpoints it killed.
+
+    An endpoint that is closer to the new branchpoint than to its current one is killed if it is within the
+    kill distance, and otherwise gets its direction and distance updated and is assigned to the new branchpoint
+    (or marked as out of range (-2) if it is beyond the influence distance).
+    """
+    ndead = 0
+    for epi in range(len(epb)):
+        if epb[epi] == -1 : continue # a dead endpoint
+        dx, dy, dz = ep[epi*3]-x, ep[epi*3+1]-y, ep[epi*3+2]-z
+        d = sqrt(dx*dx + dy*dy + dz*dz)
+        if d < epd[epi]:
+            if d > killdistance:
+                epv[epi*3  ] = dx/d
+                epv[epi*3+1] = dy/d
+                epv[epi*3+2] = dz/d
+                epd[epi] = d
+                if d < influence:
+                    epb[epi] = bi
+                else:
+                    epb[epi] = -2 # too far
+            else:
+                epb[epi] = -1 # dead
+                ndead += 1
+    return ndead
+
+def compactendpoints(ep, epv, epd, epb, epi):
+    """
+    move the endpoints that are not dead (epb != -1) to the front of the arrays, preserving their order,
+    and return their number. The caller truncates the arrays to that length.
+    """
+    w = 0
+    for r in range(len(epb)):
+        if epb[r] != -1:
+            if w != r:
+                ep[w*3  ] = ep[r*3  ]
+                ep[w*3+1] = ep[r*3+1]
+                ep[w*3+2] = ep[r*3+2]
+                epv[w*3  ] = epv[r*3  ]
+                epv[w*3+1] = epv[r*3+1]
+                epv[w*3+2] = epv[r*3+2]
+                epd[w] = epd[r]
+                epb[w] = epb[r]
+                epi[w] = epi[r]
+            w += 1
+    return w
+
+class Backend:
+    """a named set of kernels."""
+
+    def __init__(self, name, closest, direction, updateendpoints, compactendpoints):
+        self.name = name
+        self.closest = closest
+        self.direction = direction
+        self.updateendpoints = updateendpoints
+        self.compactendpoints = compactendpoints
+
+def utilcbackend():
+    from .utilc import closest as cclosest, direction as cdirection
+    return Backend('utilc', cclosest, cdirection, updateendpoints, compactendpoints)
+
+def numbabackend():
+    from numba import njit
+    jit = njit(cache=True)
+    return Backend('numba', jit(closest), jit(direction), jit(updateendpoints), jit(compactendpoints))
+
+def numpybackend():
+    from . import npkernels
+    return Backend('numpy', npkernels.closest, npkernels.direction, npkernels.updateendpoints, npkernels.compactendpoints)
+
+def pythonbackend():
+    return Backend('python', closest, direction, updateendpoints, compactendpoints)
+
+# name -> function returning a Backend (or raising ImportError), in order of preference
+backends = OrderedDict((
+    ('utilc', utilcbackend),
+    ('numba', numbabackend),
+    ('numpy', numpybackend),
+    ('python', pythonbackend),
+    ))
+
+ENVIRONMENT = 'SPACETREE_BACKEND'
+
+loaded = {}
+
+def loadbackend(name):
+    if name not in backends:
+        raise ValueError("unknown backend '%s', choose from %s"%(name, ", ".join(backends)))
+    if name not in loaded:
+        loaded[name] = backends[name]()
+    return loaded[name]
+
+def getbackend(name=None):
+    """
+    return the Backend with the given name, or if name is None or 'auto' the one named in the SPACETREE_BACKEND
+    environment variable, or else the first one that is available. A backend that is asked for by name but
+    is not available raises ImportError.
+    """
+    if name in (None, 'auto'):
+        name = os.environ.get(ENVIRONMENT, 'auto')
+    if name != 'auto':
+        return loadbackend(name)
+    for name in backends:
+        try:
+            return loadbackend(name)
+        except ImportError:
+            pass
+
+def timekernels(backend, n=2000, repeat=5):
+    """return the best time in seconds of a call to each kernel of backend for n branchpoints and endpoints."""
+    rng = Random(0)
+    bp = array('d', (rng.uniform(-5, 5) for i in range(n*3)))
+    bpc = array('i', bytes(4*n))
+    ep = array('d', (rng.uniform(-5, 5) for i in range(n*3)))
+    epb = array('i', [0]*n)
+    epd = array('d', [1e30]*n)
+    epv = array('d', bytes(8*n*3))
+    dead = array('i', (-1 if i%3 == 0 else 0 for i in range(n)))
+    calls = (
+        ('closest', backend.closest, lambda: (bp, bpc, n, 0.1, 0.2, 0.3)),
+        ('direction', backend.direction, lambda: (epv,)),
+        # updateendpoints() changes the endpoint arrays so every call gets fresh copies
+        ('updateendpoints', backend.updateendpoints,
+            lambda: (array('d', ep), array('d', epv), array('d', epd), array('i', epb), 0.1, 0.2, 0.3, 1, 0.5, 3.0)),
+        # with every third endpoint dead
+        ('compactendpoints', backend.compactendpoints,
+            lambda: (array('d', ep), array('d', epv), array('d', epd), array('i', dead), array('i', range(n)))),
+        )
+    times = OrderedDict()
+    for kernel, call, arguments in calls:
+        call(*arguments()) # compile if needed
+        best = None
+        for r in range(repeat):
+            args = arguments()
+            start = perf_counter()
+            call(*args)
+            t = perf_counter() - start
+            best = t if best is None or t < best else best
+        times[kernel] = best
+    return times
+
+def report(n=2000, repeat=5):
+    """
+    return a dict with the name of the backend getbackend() selects and for every registered backend whether it is
+    available (with the reason if not) and the time of a call to each of its kernels for n points.
+    """
+    result = OrderedDict((('selected', getbackend().name), ('environment', os.environ.get(ENVIRONMENT)), ('backends', OrderedDict())))
+    for name in backends:
+        try:
+            backend = loadbackend(name)
+        except ImportError as e:
+            result['backends'][name] = OrderedDict((('available', False), ('reason', str(e))))
+            continue
+        result['backends'][name] = OrderedDict((('available', True), ('seconds', timekernels(backend, n, repeat))))
+    return result
+
+if __name__ == "__main__":
+    print(json.dumps(report(), indent=1))
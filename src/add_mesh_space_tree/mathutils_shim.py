@@ -0,0 +1,87 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: mathutils_shim.py
+#  a minimal stand in for Blender's mathutils module so that the growth engine can run outside Blender
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import sys
+from math import sqrt
+from types import ModuleType
+
+class Vector:
+    """the part of mathutils.Vector that scanew.py relies on."""
+
+    __slots__ = ('_v',)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = [float(c) for c in seq]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def __add__(self, other):
+        return Vector(a+b for a,b in zip(self._v, other))
+
+    def __sub__(self, other):
+        return Vector(a-b for a,b in zip(self._v, other))
+
+    def __mul__(self, f):
+        return Vector(a*f for a in self._v)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, f):
+        return Vector(a/f for a in self._v)
+
+    def __neg__(self):
+        return Vector(-a for a in self._v)
+
+    def __eq__(self, other):
+        return self._v == list(other)
+
+    @property
+    def length(self):
+        return sqrt(sum(a*a for a in self._v))
+
+    def normalized(self):
+        l = self.length
+        return Vector(self._v) if l == 0 else self/l
+
+    def __repr__(self):
+        return "Vector((%s))"%", ".join("%.4f"%a for a in self._v)
+
+def install():
+    """make 'import mathutils' work, using the real module if it is available (i.e. inside Blender)."""
+    try:
+        import mathutils
+    except ImportError:
+        module = ModuleType('mathutils')
+        module.Vector = Vector
+        sys.modules['mathutils'] = module
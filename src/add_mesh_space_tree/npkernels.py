@@ -0,0 +1,85 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: npkernels.py
+#  numpy versions of the kernels in kernels.py
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+numpy implementations of closest(), direction(), updateendpoints() and compactendpoints() from kernels.py.
+
+The arrays of the SCA class are wrapped without copying, and all arithmetic is done in double precision in the
+same order as the plain python kernels, so the results are identical. Importing this module raises ImportError
+if numpy is not available.
+"""
+
+import numpy as np
+
+def view(a, n=None):
+    """return a numpy array sharing its memory with the array.array a (n rows of 3 if n is given)."""
+    v = np.frombuffer(a, dtype=a.typecode) if len(a) else np.zeros(0, dtype=a.typecode)
+    return v if n is None else v[:n*3].reshape(n, 3)
+
+def closest(pos, count, n, x, y, z):
+    if n == 0 : return 1e30, -1, (0.0, 0.0, 0.0)
+    v = np.array((x, y, z)) - view(pos, n)
+    d2 = v[:,0]*v[:,0] + v[:,1]*v[:,1] + v[:,2]*v[:,2]
+    d2[view(count)[:n] > 1] = np.inf
+    ci = int(np.argmin(d2))
+    if not d2[ci] < 1e30 : return 1e30, -1, (0.0, 0.0, 0.0)
+    return float(d2[ci]), ci, tuple(v[ci].tolist())
+
+def direction(v):
+    n = len(v)//3
+    x = y = z = 0.0
+    if n:
+        # np.add.accumulate adds the rows one after the other, as the python kernel does
+        x, y, z = np.add.accumulate(view(v, n).astype(np.float64), axis=0)[-1].tolist()
+    return (x,y,z),x*x+y*y+z*z
+
+def updateendpoints(ep, epv, epd, epb, x, y, z, bi, killdistance, influence):
+    n = len(epb)
+    if n == 0 : return 0
+    b = view(epb)
+    dist = view(epd)
+    v = view(ep, n) - np.array((x, y, z))
+    d = np.sqrt(v[:,0]*v[:,0] + v[:,1]*v[:,1] + v[:,2]*v[:,2])
+    closer = (b != -1) & (d < dist)
+    kill = closer & (d <= killdistance)
+    update = closer & (d > killdistance)
+    du = d[update]
+    view(epv, n)[update] = v[update] / du[:,None]
+    dist[update] = du
+    b[update] = np.where(du < influence, bi, -2)
+    b[kill] = -1
+    return int(np.count_nonzero(kill))
+
+def compactendpoints(ep, epv, epd, epb, epi):
+    n = len(epb)
+    b = view(epb)
+    live = b != -1
+    w = int(np.count_nonzero(live))
+    if w == n : return n
+    # boolean indexing returns copies, so the overlapping moves are safe
+    for a, rows in ((ep, n), (epv, n), (epd, None), (epi, None)):
+        v = view(a, rows)
+        v[:w] = v[live]
+    b[:w] = b[live]
+    return w
@@ -1,52 +1,25 @@
-from random import random,seed,expovariate
+from random import Random
 from functools import partial
-from math import sqrt
+from math import sqrt, sin, cos
 from time import time
 from array import array
 
 from mathutils import Vector
 
-try:
-    from .utilc import closest
-except:
-    print('utilc.closest() not available, using pure python implementation instead')
-    def closest(pos, count, n, x, y, z):
-        d2 = 1e30
-        for i in range(n):
-          if count[i] > 1 : continue
-          dx, dy, dz = x-pos[i*3], y-pos[i*3+1], z-pos[i*3+2]
-          d = dx*dx + dy*dy + dz*dz
-          if d < d2:
-            d2 = d
-            ci = i
-            v = dx,dy,dz
-        return d2, ci, v
-
-try:
-    from .utilc import direction
-except:
-    print('utilc.direction() not available, using pure python implementation instead')
-    def direction(v):
-        n = len(v)//3
-        x=0
-        y=0
-        z=0
-        for i in range(n):
-            x += v[i*3  ]
-            y += v[i*3+1]
-            z += v[i*3+2]
-
-        return (x,y,z),x*x+y*y+z*z
+from .timer import NullObserver
+
+from .kernels import getbackend
 
 class Branchpoint:
 
     count = 0
     
-    def __init__(self, p, parent, generation):
+    def __init__(self, p, parent, generation=0, tree=0):
         self.v=Vector(p)
         self.parent = parent
         self.connections = 1
         self.generation = generation
+        self.tree = tree # index of the trunk (starting point) this branchpoint grew from
         self.apex = None
         self.shoot = None
         Branchpoint.count += 1
@@ -55,19 +28,111 @@ class Branchpoint:
     def __str__(self):
         return str(self.v)+" "+str(self.parent)
         
-def sphere(r,p):
+def branchpoints(bp, bpp, bpg, bpt):
+    """return a list of connected Branchpoint objects for the flat arrays of a skeleton (see SCA for their meaning)."""
+    result=[]
+    for bi in range(len(bp)//3):
+        parent = bpp[bi]
+        result.append(Branchpoint((bp[bi*3], bp[bi*3+1], bp[bi*3+2]), parent, bpg[bi], bpt[bi]))
+        # note that we do not actually discriminate betwee apex and sideshoot, the first to connect is the apex
+        if parent is not None:
+            if result[parent].apex is None:
+                result[parent].apex = result[-1]
+            else:
+                result[parent].shoot = result[-1]
+
+    for b in result:
+        while b.parent is not None:
+            b = result[b.parent]
+            b.connections += 1 # a bit of a misnomer: this is the sum of all connected children for this branchpoint
+    return result
+
+class EndPoints:
+    """a read only sequence of Vectors created on demand from a flat x,y,z array."""
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)//3
+
+    def __getitem__(self, i):
+        if i < 0 : i += len(self)
+        if not 0 <= i < len(self) : raise IndexError(i)
+        return Vector(self.positions[i*3:i*3+3])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Vector(self.positions[i*3:i*3+3])
+
+class RandomStreams:
+    """
+    independent random number streams, all derived from a single seed.
+
+    Every consumer of random numbers draws from its own random.Random instance, so the markers do not change
+    when for example the apical control draws are made in a different order or number, and other add-ons that
+    use the global random module do not affect the result.
+    """
+
+    names = ('markers', 'apical', 'shadow', 'arrivals')
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        for name in self.names:
+            # seeding with a string is independent of PYTHONHASHSEED
+            setattr(self, name, Random("%s:%s"%(seed, name)))
+
+def apicalsuppression(factors, apicalcontrol, falloff, rng):
+    """
+    return a list of booleans, True for every apical control factor in factors whose shoot should be suppressed.
+
+    This gives the same results, and consumes the same random numbers from rng, as calling SCA.shootSupressed()
+    for each factor in turn, but the probability is calculated only once per distinct factor (i.e. number of shoots)
+    and all random numbers are drawn in one go, so it can be used by any backend that keeps the factors in an array.
+    """
+    n = len(factors)
+    if apicalcontrol <= 0 :
+        return [False]*n
+    ptable = {}
+    for f in set(factors):
+        p = 1 - f * apicalcontrol
+        ptable[f] = p ** falloff if p > 0 else None # None means always suppressed, without a draw
+    ps = [ptable[f] for f in factors]
+    draws = iter([rng.random() for i in range(n - ps.count(None))])
+    return [p is None or next(draws) > p for p in ps]
+
+def sphere(r,p,streams=None):
+    rng = (streams or RandomStreams()).markers
     r2 = r*r
     while True:
-        x = (random()*2-1)*r
-        y = (random()*2-1)*r
-        z = (random()*2-1)*r
+        x = (rng.random()*2-1)*r
+        y = (rng.random()*2-1)*r
+        z = (rng.random()*2-1)*r
         if x*x+y*y+z*z <= r2:
             yield p+Vector((x,y,z))
             
+def ellipsoid2(rxy=5,rz=5,p=Vector((0,0,8)),surfacebias=1,topbias=1,streams=None):
+    """the crown shape of the SCATree operator: an ellipsoid with optional bias toward its surface and top."""
+    random = (streams or RandomStreams()).markers.random
+    while True:
+        phi = 6.283*random()
+        theta = 3.1415*(random()-0.5)
+        r = random()**((1.0/surfacebias)/2)
+        x = r*rxy*cos(theta)*cos(phi)
+        y = r*rxy*cos(theta)*sin(phi)
+        st=sin(theta)
+        st = (((st+1)/2)**(1.0/topbias))*2-1
+        z = r*rz*st
+        yield p+Vector((x,y,z))
+
 class SCA:
 
+  # compactEndPoints() only compacts once more than this fraction of the endpoints in the arrays is dead
+  compactfraction = 0.25
+
   def __init__(self,NENDPOINTS = 100,d = 0.3,NBP = 2000, KILLDIST = 5, INFLUENCE = 15, SEED=42, volume=partial(sphere,5,Vector((0,0,8))), TROPISM=0.0, exclude=lambda p: False,
-        startingpoints=[], apicalcontrol=0, apicalcontrolfalloff=1, apicaltiming=0):
+        startingpoints=[], apicalcontrol=0, apicalcontrolfalloff=1, apicaltiming=0, excludebatch=None, excludesegments=None,
+        observer=None, lowmemory=False, backend=None):
     self.killdistance = KILLDIST
     self.branchlength = d
     self.maxiterations = NBP
@@ -77,39 +142,76 @@ class SCA:
     self.apicalcontrolfalloff = apicalcontrolfalloff
     self.apicaltiming = apicaltiming
     self.apicalstep = apicalcontrol / apicaltiming if apicaltiming > 0 else 0.0
+    # the implementation of the inner loops: a name from kernels.backends, or None to select one
+    # automatically (or by setting the SPACETREE_BACKEND environment variable)
+    self.kernels = getbackend(backend)
     
-    seed(SEED)
+    # the volume generator is called with the streams keyword and should draw its markers from streams.markers
+    self.streams = RandomStreams(SEED)
     
     self.bp = array('d')# position of the branchpoint
-    self.bp.extend((0,0,0))
-    self.bpg=[0]        # last generation 'touching' this bp
-    self.bpp=[None]     # the index of its parent
+    self.bpg=[]         # last generation 'touching' this bp
+    self.bpp=[]         # the index of its parent
     self.bpc=array('i') # the number of connected shoots
-    self.bpc.append(0)
-    self.bpa=[0]        # tha apical control factor
-    self.ep =[] # position of an endpoint
-    self.epb=[] # index of closest branchpoint
-    self.epv=[] # normalized direction of closest bp to this ep
-    self.epd=[] # distance to closest bp
+    self.bpa=array('i') # tha apical control factor
+    self.bpt=array('i') # index of the tree (i.e. the root) the bp belongs to
+    # every starting point is the root of a separate tree. All trees grow simultaneously and compete for the same endpoints
+    if len(startingpoints) == 0:
+        startingpoints = [(0,0,0)]
+    for tree,root in enumerate(startingpoints):
+        self.addRoot(getattr(root, 'v', root), tree) # starting points may be Branchpoints or positions
+    self.ntrees = len(startingpoints)
+    # the live endpoints are stored as a compact struct of arrays. Endpoints that are killed are marked with
+    # epb = -1 and removed by compactEndPoints() at the end of a generation once more than compactfraction of
+    # them is dead, so the loops over the endpoints in addBranchPoint() and growBranches() mostly visit live ones.
+    # With lowmemory=True positions, directions and distances are stored as 32 bit floats. A live endpoint then
+    # takes 48 bytes (88 bytes otherwise) and a dead one 12 bytes (24 otherwise), and the endpoints result is
+    # a view on epall instead of a list of Vectors (which would add about 100 bytes per endpoint).
+    self.lowmemory = lowmemory
+    self.ftype = 'f' if lowmemory else 'd'
+    self.ep =array(self.ftype) # position of an endpoint (flat x,y,z)
+    self.epb=array('i') # index of closest branchpoint
+    self.epv=array(self.ftype) # normalized direction of closest bp to this ep (flat x,y,z)
+    self.epd=array(self.ftype) # distance to closest bp
+    self.epi=array('i') # stable id of the endpoint, i.e. its index in epall
+    self.epall=array(self.ftype) # position of every endpoint ever added, live or dead (flat x,y,z), indexed by stable id
+    self.ndead = 0      # number of endpoints killed since the last compaction
+    self.bpe = None     # during growBranches(): branchpoint index -> array of the indices of the endpoints assigned to it
     
-    self.volumepoint=volume()
+    self.volumepoint=volume(streams=self.streams)
     self.exclude=exclude
+    # batch alternatives to exclude(): called once per generation with all candidate branchpoints as a flat xyz array
+    # (excludebatch) or with the flat xyz arrays of the parents and candidates (excludesegments). Both return a sequence
+    # of booleans, True meaning the candidate is rejected. If given they take precedence over exclude(), except that
+    # the shoots of the roots are tested with exclude() as well, see addNewBranchPoints()
+    self.excludebatch=excludebatch
+    self.excludesegments=excludesegments
+    # an observer (e.g. a timer.Profile) gets timing spans via observer.span(label) and a dict of counters
+    # after each generation via observer.generation(stats)
+    self.observer = observer if observer is not None else NullObserver()
+    self.resetCounters()
 
     # result arrays, filled *after* iterations
     self.branchpoints = []
     self.endpoints = []
+    self.generations = 0
+    self.stopreason = ''
 
-    for i in range(NENDPOINTS):
+    with self.observer.span('addEndPoints'):
+      for i in range(NENDPOINTS):
         self.addEndPoint(next(self.volumepoint))
 
-    if len(startingpoints)>0:
-        self.bp=array('d')
-        self.bpp=[]
-        self.bpc=array('i')
-        for bp in startingpoints:
-            self.addBranchPoint(bp.v, -1, 0)
+  def addRoot(self, bp, tree):
+    """add the first branchpoint of a new tree. Roots should be added before any endpoint."""
+    self.bp.extend(tuple(bp))
+    self.bpg.append(0)
+    self.bpp.append(None)
+    self.bpc.append(0)
+    self.bpa.append(0)
+    self.bpt.append(tree)
 
-  def addBranchPoint(self, bp, pi, generation):
+  def appendBranchPoint(self, bp, pi, generation):
+    """add a branchpoint with parent pi to the branchpoint arrays without updating the endpoints, return its index."""
     self.bp.extend(tuple(bp))# even if it is passed as a vector we turn it in to a tuple to ease a later coversion to numpy
     self.bpg.append(generation)
     ppi = pi
@@ -119,47 +221,102 @@ class SCA:
     self.bpp.append(pi)
     self.bpc.append(0)
     self.bpa.append(0)
+    self.bpt.append(self.bpt[pi])
     self.bpc[pi]+=1
-    bi = len(self.bp)//3-1
+    # update apical control factors
+    self.bpa[pi] += 1
+    return len(self.bp)//3-1
+
+  def addBranchPoint(self, bp, pi, generation):
+    bi = self.appendBranchPoint(bp, pi, generation)
     # if the new branchpoint is closer than any other branchpoint it will make that endpoint point to itself
     # if the new branchpoint is within kill distance of an endpoint it will mark it as dead
     # if not in the influence range it will mark the the endpoint as out of range but still store the distance
     
 
-    for epi,(ep,epd,epb) in enumerate(zip(self.ep,self.epd, self.epb)):
-      if epb != -1: # not a dead endpoint
-        v = ep[0]-bp[0],ep[1]-bp[1],ep[2]-bp[2]
-        d2= v[0]*v[0]+v[1]*v[1]+v[2]*v[2]
-        d = sqrt(d2)
-        if d < epd:
-          if d>self.killdistance:
-            self.epv[epi]= v[0]/d,v[1]/d,v[2]/d
-            self.epd[epi]=d
-            if d < self.influence:
-                self.epb[epi]=bi  # dead
-            else:
-                self.epb[epi]=-2  # too far
-          else:
-            self.epb[epi]=-1
+    ep, epv, epd, epb = self.ep, self.epv, self.epd, self.epb
+    ftype = self.ftype
+    killed = self.kernels.updateendpoints(ep, epv, epd, epb, bp[0], bp[1], bp[2], bi, self.killdistance, self.influence)
+    self.ndead += killed
+    self.nkilled += killed
     if self.bpc[pi]>1:  # a branch point with two children will not grow any new branches ...
-      for epi,epb in enumerate(self.epb):
-        if epb == pi:   # ... so any endpoint that points to this branchpoint is reassigned
-          bi, v, d = self.closestBranchPoint(self.ep[epi])
-          self.epb[epi]=bi
-          self.epv[epi]=v
-          self.epd[epi]=d
-    # update apical control factors
-    self.bpa[pi] += 1
+      bpe = self.bpe
+      for epi in (range(len(epb)) if bpe is None else bpe.get(pi, ())):
+        if epb[epi] == pi:   # ... so any endpoint that points to this branchpoint is reassigned
+          bi, v, d = self.closestBranchPoint(ep[epi*3:epi*3+3])
+          epb[epi]=bi
+          epv[epi*3:epi*3+3]=array(ftype,v)
+          epd[epi]=d
+          self.nreassigned += 1
+          if bpe is not None and bi >= 0:
+            bpe.setdefault(bi, array('i')).append(epi)
+
+  def hasLiveEndPoints(self):
+    """return True if any endpoint is still alive and within the influence range of a branchpoint."""
+    return len(self.epb) > 0 and max(self.epb) >= 0
     
   def addEndPoint(self,ep):
-    self.ep.append(tuple(ep)) # even if it is passed as a vector we turn it in to a tuple to ease a later coversion to numpy
+    ep = tuple(ep) # even if it is passed as a vector we turn it in to a tuple to ease a later coversion to numpy
+    self.epi.append(len(self.epall)//3)
+    self.epall.extend(ep)
+    self.ep.extend(ep)
     bi, v, d = self.closestBranchPoint(ep)
     self.epb.append(bi)
-    self.epv.append(v)
+    self.epv.extend(v)
     self.epd.append(d)
 
+  def compactEndPoints(self, force=False):
+    """remove dead endpoints from the live endpoint arrays, preserving the order of the remaining ones.
+
+    This is done in place by a kernel of the backend, so no temporary copies of the (possibly huge) endpoint
+    arrays are needed. Unless force is True it is skipped while at most compactfraction of the endpoints is dead."""
+    if self.ndead == 0 : return
+    if not force and self.ndead <= self.compactfraction * len(self.epb) : return
+    ep, epv, epd, epb, epi = self.ep, self.epv, self.epd, self.epb, self.epi
+    w = self.kernels.compactendpoints(ep, epv, epd, epb, epi)
+    del ep[w*3:], epv[w*3:], epd[w:], epb[w:], epi[w:]
+    self.ndead = 0
+
+  def liveEndPoints(self):
+    """return the number of endpoints that are not dead."""
+    return len(self.epb) - self.ndead
+
+  def resetCounters(self):
+    """reset the per generation counters that are passed to the observer."""
+    self.nactive = 0      # branchpoints with endpoints assigned to them
+    self.nsuppressed = 0  # active branchpoints that did not grow because of apical control
+    self.nadded = 0       # new branchpoints
+    self.nrejected = 0    # new branchpoints rejected by the exclusion test
+    self.nkilled = 0      # endpoints killed
+    self.nnqueries = 0    # nearest branchpoint queries (closestBranchPoint calls)
+    self.nreassigned = 0  # endpoints reassigned because their branchpoint got saturated
+
+  def counters(self, generation):
+    return {'generation':generation,
+        'liveendpoints':self.liveEndPoints(),
+        'branchpoints':len(self.bp)//3,
+        'activebranchpoints':self.nactive,
+        'suppressed':self.nsuppressed,
+        'added':self.nadded,
+        'rejected':self.nrejected,
+        'killed':self.nkilled,
+        'nnqueries':self.nnqueries,
+        'reassigned':self.nreassigned}
+
+  def endpointStates(self):
+    """
+    return an array with the state of every endpoint ever added, indexed by stable id (i.e. in the order of
+    epall and endpoints): 0 = dead (killed), 1 = alive (assigned to a branchpoint), 2 = alive but out of range.
+    """
+    states = array('b', bytes(len(self.epall)//3))
+    for epi,bi in zip(self.epi, self.epb):
+      if bi != -1: # not killed since the last compaction
+        states[epi] = 1 if bi >= 0 else 2
+    return states
+
   def closestBranchPoint(self, p):
-    d2, bbi, bv = closest(self.bp, self.bpc, len(self.bp)//3, p[0], p[1], p[2])
+    self.nnqueries += 1
+    d2, bbi, bv = self.kernels.closest(self.bp, self.bpc, len(self.bp)//3, p[0], p[1], p[2])
     d=sqrt(d2)
     return bbi if d < self.influence else -2, (bv[0]/d,bv[1]/d,bv[2]/d), d
 
@@ -176,82 +333,165 @@ class SCA:
     if p <= 0 :
         return True
     p = p ** self.apicalcontrolfalloff  # positive values. < 1 will ease the falloff, > 1 will sharpen the fallof
-    return random() > p    
+    return self.streams.apical.random() > p    
+    
+  def suppressedShoots(self, bpis):
+    """returns a list of booleans, true for each branchpoint index in bpis whose growing shoot should be supressed"""
+    bpa = self.bpa
+    return apicalsuppression([bpa[bpi] for bpi in bpis], self.apicalcontrol, self.apicalcontrolfalloff, self.streams.apical)
     
     
+  def endpointIndex(self):
+    """return a dict mapping the index of every branchpoint with endpoints assigned to it to an array of their indices."""
+    bpe = {}
+    for epi,bi in enumerate(self.epb):
+      if bi >= 0: # skip dead (-1) and out of range (-2) endpoints
+        e = bpe.get(bi)
+        if e is None:
+          bpe[bi] = array('i',(epi,))
+        else:
+          e.append(epi)
+    return bpe
+
   def growBranches(self, generation):
-    bis = set(self.epb) # unique branch points indices that have closests endpoints
-    bis.discard(-1) # remove dead endpoints if present
-    bis.discard(-2) # remove endpoints not in range 
+    # the reverse index from branchpoints to their endpoints is built once per generation. addBranchPoint() adds
+    # the endpoints it reassigns, entries of endpoints that were killed or taken over by a new branchpoint
+    # since are not removed, so users must check epb. Compacting the endpoints invalidates the index.
+    with self.observer.span('endpointIndex'):
+      self.bpe = bpe = self.endpointIndex()
+    bis = bpe.keys() # unique branch points indices that have closests endpoints
     newbps=[]
     newbpps=[]
     # we iterate over all branchpoints that actually have endpoints that are closest to them
     # (branchpoints with two shoots for example will not have any endpoint markes as closest to them,
     # something that is taken care of by the addBranchPoint() function)
-    for bpi in bis:
-      if self.shootSupressed(self.bpa[bpi]) : continue # don't grow a branch if apical control is to strong
+    self.nactive = len(bis)
+    bis = sorted(bis) # a fixed order keeps the apical control draws reproducible
+    for bpi,suppressed in zip(bis, self.suppressedShoots(bis)):
+      if suppressed : # don't grow a branch if apical control is to strong
+        self.nsuppressed += 1
+        continue
       
-      epvs = array('d',[c for epi,v in enumerate(self.epv) if self.epb[epi]==bpi for c in v])
+      epvs = array('d',[c for epi in bpe[bpi] for c in self.epv[epi*3:epi*3+3]])
       # the direction of the new branchpoint is the average of the normalized directions to the closest endpoints
       # (normalizing the direction will give them all equal weight).
 
-      v,d2 = direction(epvs)      
+      v,d2 = self.kernels.direction(epvs)      
       d = sqrt(d2) / self.branchlength
       vd= v[0]/d,v[1]/d,v[2]/d
 
       newbps.append((self.bp[bpi*3]+vd[0], self.bp[bpi*3+1]+vd[1], self.bp[bpi*3+2]+vd[2]+self.tropism ))
       newbpps.append(bpi)
-    for newbp,newbpp in zip(newbps,newbpps):
-      if not self.exclude(Vector(newbp)):
-        self.addBranchPoint(newbp, newbpp, generation)
+    if len(newbps) == 0:
+      self.bpe = None
+      return
+    self.addNewBranchPoints(newbps, newbpps, generation)
+    self.bpe = None
+    with self.observer.span('compactEndPoints'):
+      self.compactEndPoints()
+
+  def addNewBranchPoints(self, newbps, newbpps, generation):
+    with self.observer.span('exclude'):
+      if self.excludesegments is not None:
+        starts = array('d',[c for bpi in newbpps for c in self.bp[bpi*3:bpi*3+3]])
+        excluded = list(self.excludesegments(starts, array('d',[c for bp in newbps for c in bp])))
+        # a segment test assumes the start of a segment was accepted, which is not true for a root (a starting
+        # point), so its shoots are tested by themselves with exclude() as well
+        for i,bpi in enumerate(newbpps):
+          if self.bpp[bpi] is None and not excluded[i]:
+            excluded[i] = self.exclude(Vector(newbps[i]))
+      elif self.excludebatch is not None:
+        excluded = self.excludebatch(array('d',[c for bp in newbps for c in bp]))
+      else:
+        excluded = [self.exclude(Vector(newbp)) for newbp in newbps]
+    with self.observer.span('addBranchPoints'):
+      for newbp,newbpp,rejected in zip(newbps,newbpps,excluded):
+        if rejected:
+          self.nrejected += 1
+        else:
+          self.addBranchPoint(newbp, newbpp, generation)
+          self.nadded += 1
 
    
-  def iterate(self, newendpointsper1000=0, maxtime=0.0):
+  def iterate(self, newendpointsper1000=0, maxtime=0.0, patience=0, mingrowth=0):
+    """
+    grow the tree for at most maxiterations generations or maxtime seconds (if > 0).
+
+    Growth stops early when it has converged: when no live endpoint is within the influence range of a branchpoint
+    (and no new endpoints will be added) nothing can grow anymore. If patience > 0 growth also stops after that many
+    consecutive generations that added no more than mingrowth branchpoints.
+    The number of generations actually grown is stored in self.generations, the reason to stop in self.stopreason.
+    """
+    for generation in self.grow(newendpointsper1000, maxtime, patience, mingrowth):
+      pass
+
+    with self.observer.span('buildResults'):
+      self.buildResults()
+
+  def grow(self, newendpointsper1000=0, maxtime=0.0, patience=0, mingrowth=0):
+    """
+    a generator that grows the tree like iterate() does, yielding the generation number after each generation.
+
+    This allows a caller to interleave growing with other work (like keeping a user interface responsive) or
+    to abandon growth halfway. Unlike iterate() it does not call buildResults() when done.
+    """
     starttime=time()      
     endpointsadded=0.0
     niterations=0.0
     newendpointsper1000 /= 1000.0
-    t=expovariate(newendpointsper1000) if newendpointsper1000 > 0.0 else 1 # time to the first new 'endpoint add event'
+    t=self.streams.arrivals.expovariate(newendpointsper1000) if newendpointsper1000 > 0.0 else 1 # time to the first new 'endpoint add event'
+    stalled=0
+    self.generations=0
+    self.stopreason='maximum iterations reached'
+
+    observer=self.observer
 
     for i in range(self.maxiterations):
-        self.growBranches(i)
-        if maxtime>0 and time()-starttime>maxtime: break
-        if newendpointsper1000 > 0.0:
+      self.resetCounters()
+      stop = None
+      with observer.span('generation'):
+        nbp = len(self.bp)//3
+        with observer.span('growBranches'):
+            self.growBranches(i)
+        self.generations = i+1
+        stalled = stalled + 1 if len(self.bp)//3 - nbp <= mingrowth else 0
+        if maxtime>0 and time()-starttime>maxtime:
+            stop = 'time limit reached'
+        # endpoints that are dead or out of range never become active again unless a branchpoint grows near them
+        elif newendpointsper1000 <= 0.0 and not self.hasLiveEndPoints():
+            stop = 'no live endpoints in range'
+        elif patience > 0 and stalled >= patience:
+            stop = 'no growth for %d generations'%stalled
+        elif newendpointsper1000 > 0.0:
+          with observer.span('addEndPoints'):
             # generate new endpoints with a poisson process
             # when we first arrive here, t already holds the time to the first event
             niterations+=1
             while t < niterations: # we keep on adding endpoints as long as the next event still happens within this iteration
                 self.addEndPoint(next(self.volumepoint))
                 endpointsadded+=1
-                t+=expovariate(newendpointsper1000) # time to new 'endpoint add event'
+                t+=self.streams.arrivals.expovariate(newendpointsper1000) # time to new 'endpoint add event'
         # reduce apical control
         if self.apicaltiming > 0:
             self.apicaltiming -=1
             self.apicalcontrol -= self.apicalstep
             if self.apicalcontrol < 0 :
                 self.apicalcontrol = 0.0
+      observer.generation(self.counters(i))
+      if stop is not None:
+        self.stopreason = stop
+      yield i
+      if stop is not None:
+        break
 
-    self.branchpoints=[]
-    for bi in range(len(self.bp)//3):
-        bp = self.bp[bi*3], self.bp[bi*3+1], self.bp[bi*3+2]
-        bpp= self.bpp[bi]
-        gen= self.bpg[bi]
-        self.branchpoints.append(Branchpoint(bp, bpp, gen))
-        # note that we do not actually discriminate betwee apex and sideshoot, the first to connect is the apex
-        if bpp is not None:
-            parent = self.branchpoints[bpp]
-            if parent.apex is None:
-                parent.apex = self.branchpoints[-1]
-            else:
-                parent.shoot = self.branchpoints[-1]
-
-    for bp in self.branchpoints:
-        bpp = bp
-        while bpp.parent is not None:
-            bpp = self.branchpoints[bpp.parent]
-            bpp.connections += 1 # a bit of a misnomer: this is the sum of all connected children for this branchpoint
+  def buildResults(self):
+    """convert the internal arrays to lists of Branchpoint objects and endpoint Vectors."""
+    self.branchpoints = branchpoints(self.bp, self.bpp, self.bpg, self.bpt)
         
+    if self.lowmemory:
+        self.endpoints = EndPoints(self.epall)
+        return
     self.endpoints=[]
-    for ep in self.ep:
-        self.endpoints.append(Vector(ep))
+    for epi in range(len(self.epall)//3):
+        self.endpoints.append(Vector(self.epall[epi*3:epi*3+3]))
     #print('endpoints',len(self.endpoints))    
\ No newline at end of file
@@ -0,0 +1,1314 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# the Blender side of the add-on: crown shapes, geometry creation and the SCATree operator
+
+from time import time
+from functools import partial
+from array import array
+
+import bpy
+from bpy.props import FloatProperty, IntProperty, BoolProperty, EnumProperty, StringProperty
+from mathutils import Vector,Euler,Matrix,Quaternion
+
+from .timer import Timer, Profile
+# scanew (the growth engine and through it the kernel backends) and utils are imported on first use,
+# so enabling the add-on at Blender startup costs as little as possible
+
+def availableGroups(self, context):
+    return [(name, name, name, n) for n,name in enumerate(bpy.data.groups.keys())]
+
+def availableGroupsOrNone(self, context):
+    groups = [ ('None', 'None', 'None', 0) ]
+    return groups + [(name, name, name, n+1) for n,name in enumerate(bpy.data.groups.keys())]
+
+def availableObjects(self, context):
+    return [(name, name, name, n+1) for n,name in enumerate(bpy.data.objects.keys())]
+
+particlesettings = {}
+barkmaterials = {}
+# the names of the materials and particle settings appended from material_lib.blend, see loadLibraries()
+librarycache = {}
+# the last grown skeleton ('sca') and the growth key ('key') it was grown with, see SCATree.growthKey()
+lastgrowth = {}
+# a skeleton grown elsewhere for the next execute() to build the tree from ('sca'), see batch.py
+pregrown = {}
+
+def availableParticleSettings(self, context):
+    global particlesettings
+    # im am not sure why self.__class__.particlesettings != bpy.types.MESH_OT_sca_tree ....
+    settings = [ ('None', 'None', 'None', 0) ]
+    #    return settings + [(name, name, name, n+1) for n,name in enumerate(bpy.types.MESH_OT_sca_tree.particlesettings.keys())]
+    # (identifier, name, description, number)
+    # note, when we create a new tree the particles settings will be made unique so they can be tweaked individually for
+    # each tree. That also means they will  have distinct names, but we manipulate those to be displayed in a consistent way
+    return settings + [(name, name.split('.')[0], name, n+1) for n,name in enumerate(particlesettings.keys())]
+
+def availableBarkMaterials(self, context):
+    global barkmaterials
+    return [(name, name.split('.')[0], name, n) for n,name in enumerate(barkmaterials.keys())]
+
+def ellipsoid(r=5,rz=5,p=Vector((0,0,8)),taper=0,streams=None):
+    from .scanew import RandomStreams
+    random = (streams or RandomStreams()).markers.random
+    r2=r*r
+    z2=rz*rz
+    if rz>r : r = rz
+    while True:
+        x = (random()*2-1)*r
+        y = (random()*2-1)*r
+        z = (random()*2-1)*r
+        f = (z+r)/(2*r)
+        f = 1 + f*taper if taper>=0 else (1-f)*-taper
+        if f*x*x/r2+f*y*y/r2+z*z/z2 <= 1:
+            yield p+Vector((x,y,z))
+
+def pointInsideMesh(pointrelativetocursor,ob):
+    # adapted from http://blenderartists.org/forum/showthread.php?195605-Detecting-if-a-point-is-inside-a-mesh-2-5-API&p=1691633&viewfull=1#post1691633
+    mat = ob.matrix_world.inverted()
+    orig = mat*(pointrelativetocursor+bpy.context.scene.cursor_location)
+    count = 0
+    axis=Vector((0,0,1))
+    while True:
+        location,normal,index = ob.ray_cast(orig,orig+axis*10000.0)[-3:]
+        if index == -1: break
+        count += 1
+        orig = location + axis*0.00001
+    if count%2 == 0:
+        return False
+    return True
+    
+def halton3D(index):
+    """
+    return a quasi random 3D vector R3 in [0,1].
+    each component is based on a halton sequence. 
+    quasi random is good enough for our purposes and is 
+    more evenly distributed then pseudo random sequences. 
+    See en.m.wikipedia.org/wiki/Halton_sequence
+    """
+
+    def halton(index, base):
+        result=0
+        f=1.0/base
+        I=index
+        while I>0:
+            result += f*(I%base)
+            I=int(I/base)
+            f/=base
+        return result
+    return Vector((halton(index,2),halton(index,3),halton(index,5)))
+
+def insidegroup(pointrelativetocursor, group):
+    if bpy.data.groups.find(group)<0 : return False
+    for ob in bpy.data.groups[group].objects:
+        if isinstance(ob.data, bpy.types.Mesh) and pointInsideMesh(pointrelativetocursor,ob):
+            return True
+    return False
+
+def segmentsinsidegroup(starts, ends, group):
+    """
+    return a list of booleans, one for each segment start->end given as flat xyz arrays (relative to the cursor),
+    True if the segment crosses the surface of any mesh object in the group.
+
+    Because the start of a new internode (its parent branchpoint) was itself accepted, a segment that ends inside
+    a closed mesh must cross its surface, so a single ray per segment and object suffices. Unlike insidegroup() this
+    also stops branches that would pierce thin parts of the exclusion geometry.
+    """
+    n = len(ends)//3
+    crosses = [False]*n
+    if bpy.data.groups.find(group)<0 : return crosses
+    cursor = bpy.context.scene.cursor_location
+    for ob in bpy.data.groups[group].objects:
+        if not isinstance(ob.data, bpy.types.Mesh): continue
+        mat = ob.matrix_world.inverted()
+        for i in range(n):
+            if crosses[i] : continue
+            start = mat*(Vector(starts[i*3:i*3+3])+cursor)
+            end = mat*(Vector(ends[i*3:i*3+3])+cursor)
+            index = ob.ray_cast(start,end)[-1]
+            crosses[i] = index != -1
+    return crosses
+
+def groupdistribution(crowngroup,shadowgroup=None,shadowdensity=0.5, seed=0,size=Vector((1,1,1)),pointrelativetocursor=Vector((0,0,0)),streams=None):
+    from .scanew import RandomStreams
+    random = (streams or RandomStreams(seed)).shadow.random
+    if crowngroup == shadowgroup:
+        shadowgroup = None # safeguard otherwise every marker would be rejected
+    nocrowngroup = bpy.data.groups.find(crowngroup)<0
+    noshadowgroup = (shadowgroup is None) or (bpy.data.groups.find(shadowgroup)<0) or (shadowgroup == 'None')
+    index=100+seed
+    nmarkers=0
+    nyield=0
+    while True:
+        nmarkers+=1
+        v = halton3D(index)
+        v[0] *= size[0]
+        v[1] *= size[1]
+        v[2] *= size[2]
+        v+=pointrelativetocursor
+        index+=1
+        insidecrown = nocrowngroup or insidegroup(v,crowngroup)
+        outsideshadow = noshadowgroup # if there's no shadowgroup we're always outside of it
+        if not outsideshadow:
+            inshadow = insidegroup(v,shadowgroup) # if there is, check if we're inside the group
+            if not inshadow:
+                outsideshadow = True
+            else:
+                outsideshadow = random() > shadowdensity  # if inside the group we might still generate a marker if the density is low
+        # if shadowgroup overlaps all or a significant part of the crowngroup
+        # no markers will be yielded and we would be in an endless loop.
+        # so if we yield too few correct markers we start yielding them anyway.
+        lowyieldrate = (nmarkers>200) and (nyield/nmarkers < 0.01)
+        if (insidecrown and outsideshadow) or lowyieldrate:
+            nyield+=1
+            yield v
+        
+def groupExtends(group):
+    """
+    return a size,minimum tuple both Vector elements, describing the size and position
+    of the bounding box in world space that encapsulates all objects in a group.
+    """
+    bb=[]
+    if bpy.data.groups.find(group) >=0 :
+        for ob in bpy.data.groups[group].objects:
+            rot = ob.matrix_world.to_quaternion()
+            scale = ob.matrix_world.to_scale()
+            translate = ob.matrix_world.translation
+            for v in ob.bound_box: # v is not a vector but an array of floats
+                p = ob.matrix_world * Vector(v[0:3])
+                bb.extend(p[0:3])
+        mx = Vector((max(bb[0::3]), max(bb[1::3]), max(bb[2::3])))
+        mn = Vector((min(bb[0::3]), min(bb[1::3]), min(bb[2::3])))
+        return mx-mn,mn
+    return Vector((2,2,2)),Vector((-1,-1,-1)) # a 2x2x2 cube when the group does not exist
+    
+class Preview:
+    """
+    an edge only mesh showing the skeleton of a tree that is still growing.
+
+    update() only appends the branchpoints and edges added since the previous update and writes
+    the coordinates and edges with foreach_set(), so updating is cheap even for large skeletons.
+    """
+
+    def __init__(self, name='TreePreview'):
+        self.mesh = bpy.data.meshes.new(name)
+        self.obj = bpy.data.objects.new(name, self.mesh)
+        self.obj.location = bpy.context.scene.cursor_location
+        bpy.context.scene.objects.link(self.obj)
+        self.edges = array('i') # flat vertex index pairs of all edges so far
+        self.nbp = 0            # number of branchpoints already in the mesh
+
+    def update(self, sca):
+        nbp = len(sca.bp)//3
+        if nbp <= self.nbp : return
+        for bi in range(self.nbp, nbp):
+            parent = sca.bpp[bi]
+            if parent is not None and parent >= 0:
+                self.edges.extend((parent, bi))
+        mesh = self.mesh
+        mesh.vertices.add(nbp - self.nbp)
+        mesh.vertices.foreach_set('co', array('f', sca.bp))
+        ne = len(self.edges)//2 - len(mesh.edges)
+        if ne > 0:
+            mesh.edges.add(ne)
+            mesh.edges.foreach_set('vertices', self.edges)
+        mesh.update()
+        self.nbp = nbp
+
+    def remove(self):
+        bpy.context.scene.objects.unlink(self.obj)
+        bpy.data.objects.remove(self.obj)
+        bpy.data.meshes.remove(self.mesh)
+
+def createMarkers(tree,scale=0.05):
+    #not used as markers are parented to tree object that is created at the cursor position
+    #p=bpy.context.scene.cursor_location
+    
+    verts=[]
+    faces=[]
+
+    tetraeder = [Vector((-1,1,-1)),Vector((1,-1,-1)),Vector((1,1,1)),Vector((-1,-1,1))]
+    tetraeder = [v * scale for v in tetraeder]
+    tfaces = [(0,1,2),(0,1,3),(1,2,3),(0,3,2)]
+    
+    for eip,ep in enumerate(tree.endpoints):
+        verts.extend([ep + v for v in tetraeder])
+        n=len(faces)
+        faces.extend([(f1+n,f2+n,f3+n) for f1,f2,f3 in tfaces])
+        
+    mesh = bpy.data.meshes.new('Markers')
+    mesh.from_pydata(verts,[],faces)
+    mesh.update(calc_edges=True)
+    return mesh
+
+# vertex group names of the marker states returned by SCA.endpointStates()
+markerstates = ('Dead', 'Alive', 'TooFar')
+
+def createMarkerPoints(tree):
+    """return a vertex only mesh with a vertex for every marker, written in bulk from the flat marker positions."""
+    mesh = bpy.data.meshes.new('Markers')
+    mesh.vertices.add(len(tree.epall)//3)
+    mesh.vertices.foreach_set('co', tree.epall)
+    mesh.update()
+    return mesh
+
+def addMarkerGroups(ob, tree):
+    """add a vertex group for each marker state (dead, alive and too far) to the object created from createMarkerPoints()."""
+    states = tree.endpointStates()
+    if states is None : return
+    indices = tuple([] for state in markerstates)
+    for i,state in enumerate(states):
+        indices[state].append(i)
+    for name, members in zip(markerstates, indices):
+        group = ob.vertex_groups.new(name)
+        if members:
+            group.add(members, 1.0, 'REPLACE')
+
+def createMarkerInstance(scale=0.05):
+    """return a mesh with a single tetrahedron, to be instanced on the vertices of a marker points object."""
+    tetraeder = [Vector((-1,1,-1)),Vector((1,-1,-1)),Vector((1,1,1)),Vector((-1,-1,1))]
+    mesh = bpy.data.meshes.new('Marker')
+    mesh.from_pydata([v * scale for v in tetraeder],[],[(0,1,2),(0,1,3),(1,2,3),(0,3,2)])
+    mesh.update(calc_edges=True)
+    return mesh
+
+def basictri(bp, verts, radii, power, scale, p):
+    v = bp.v + p
+    nv = len(verts)
+    r=(bp.connections**power)*scale
+    a=-r
+    b=r*0.5   # cos(60)
+    c=r*0.866 # sin(60)
+    verts.extend([v+Vector((a,0,0)), v+Vector((b,-c,0)), v+Vector((b,c,0))]) # provisional, should become an optimally rotated triangle
+    radii.extend([bp.connections,bp.connections,bp.connections])
+    return (nv, nv+1, nv+2)
+    
+def _simpleskin(bp, loop, verts, faces, radii, power, scale, p):
+    newloop = basictri(bp, verts, radii, power, scale, p)
+    for i in range(3):
+        faces.append((loop[i],loop[(i+1)%3],newloop[(i+1)%3],newloop[i]))
+    if bp.apex:
+        _simpleskin(bp.apex, newloop, verts, faces, radii, power, scale, p)
+    if bp.shoot:
+        _simpleskin(bp.shoot, newloop, verts, faces, radii, power, scale, p)
+    
+def simpleskin(bp, verts, faces, radii, power, scale, p):
+    loop = basictri(bp, verts, radii, power, scale, p)
+    if bp.apex:
+        _simpleskin(bp.apex, loop, verts, faces, radii, power, scale, p)
+    if bp.shoot:
+        _simpleskin(bp.shoot, loop, verts, faces, radii, power, scale, p)
+
+def prismCorners(scale):
+    """return the corners of a leaf emitter prism around the origin: the triangle of basictri() (with power 0)
+    and the same triangle lifted by scale."""
+    a=-scale
+    b=scale*0.5   # cos(60)
+    c=scale*0.866 # sin(60)
+    return ((a,0,0), (b,-c,0), (b,c,0), (a,0,scale), (b,-c,scale), (b,c,scale))
+
+def createLeaves2(branchpoints, p, scale, maxconnections=0):
+    """
+    return a LeafEmitter mesh, its number of faces and the radius (number of connections) of each of its vertices.
+
+    Every branchpoint, or if maxconnections > 0 only those with at most that many connections (i.e. not the
+    thick parts of the trunk and branches where no leaves appear), gets an open triangular prism of the given
+    size. The vertices and faces are computed in flat arrays and written with foreach_set().
+    """
+    corners = prismCorners(scale)
+    # the three sides of each prism as offsets into its six vertices
+    sides = (0,1,4,3, 1,2,5,4, 2,0,3,5)
+    
+    emitters = [bp for bp in branchpoints if maxconnections <= 0 or bp.connections <= maxconnections]
+    n = len(emitters)
+    co = array('f', [0.0])*(n*18)
+    radii = array('i', [0])*(n*6)
+    i = 0
+    for e,bp in enumerate(emitters):
+        x, y, z = bp.v + p
+        for dx, dy, dz in corners:
+            co[i  ] = x+dx
+            co[i+1] = y+dy
+            co[i+2] = z+dz
+            i += 3
+        radii[e*6:e*6+6] = array('i', [bp.connections])*6
+    loops = array('i', [e*6+s for e in range(n) for s in sides])
+    
+    mesh = bpy.data.meshes.new('LeafEmitter')
+    mesh.vertices.add(n*6)
+    mesh.vertices.foreach_set('co', co)
+    mesh.loops.add(n*12)
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.add(n*3)
+    mesh.polygons.foreach_set('loop_start', array('i', range(0, n*12, 4)))
+    mesh.polygons.foreach_set('loop_total', array('i', [4])*(n*3))
+    mesh.update(calc_edges=True)
+    return mesh, n*3, radii
+
+def pruneTree(tree, generation, treeindex=None):
+    """return the branchpoints last touched in or after generation (and belonging to tree treeindex if not None)
+    plus a mapping from their original index to their position in the returned list."""
+    nbp = []
+    i2p = {}
+    #print()
+    for i,bp in enumerate(tree):
+        #print(i, bp.v, bp.generation, bp.parent, end='')
+        if bp.generation >= generation and (treeindex is None or bp.tree == treeindex):
+            #print(' keep', end='')
+            bp.index = i
+            i2p[i] = len(nbp)
+            nbp.append(bp)
+        #print()
+    return nbp, i2p
+    
+def setWeights(group, radii, bleaf, maxr):
+    """
+    give every vertex a weight (1-r/maxr)**bleaf in a vertex group, where r is its radius (number of connections).
+    Vertices with the same radius are added in one call, and there are only a few distinct radii.
+    """
+    byradius = {}
+    for i,r in enumerate(radii):
+        byradius.setdefault(r, []).append(i)
+    for r,indices in byradius.items():
+        group.add(indices, (1.0-r/maxr)**bleaf, 'REPLACE')
+
+def maxRadius(radii, default):
+    # pruning might have been so aggressive that there are no radii (NB. python 3.3 does not know the default keyword for the max() function)
+    maxr = max(radii) if len(radii)>0 else default
+    if maxr<=0 : maxr=1.0
+    return float(maxr)
+
+def createGeometry(tree, power=0.5, scale=0.01,
+    nomodifiers=True, skinmethod='NATIVE', subsurface=False,
+    bleaf=1.0,
+    leafParticles='None',
+    objectParticles='None',
+    emitterscale=0.1,
+    timeperf=True,
+    prune=0,
+    profile=None,
+    treeindex=None,
+    leafconnections=0):
+
+    global particlesettings
+    from .utils import get_vertex_group
+    
+    # if a profile is passed, the timings of the individual steps are added to it (and not printed here)
+    timings = Timer() if profile is None else profile
+    
+    # the vertices are relative to the origin of the tree object, which is placed at the 3D cursor
+    # (everything is built with the data API: each operator call would trigger a scene update)
+    cursor=bpy.context.scene.cursor_location.copy()
+    p=Vector((0,0,0))
+    verts=[]
+    edges=[]
+    faces=[]
+    radii=[]
+    roots=set()
+    rootindices=array('i') # vertex indices of the roots
+    
+    # prune if requested and select a single tree if we grew more than one and want them as separate objects
+    branchpoints, index2position = pruneTree(tree.branchpoints, prune, treeindex)
+        
+    # Loop over all branchpoints and create connected edges
+    #print('\ngenerating skeleton')
+    
+    for n,bp in enumerate(branchpoints):
+        #print(n, bp.index, bp.v, bp.generation, bp.parent)
+        verts.append(bp.v+p)
+        radii.append(bp.connections)
+        if not (bp.parent is None) :
+            #print(bp.parent,index2position[bp.parent])
+            edges.append((len(verts)-1,index2position[bp.parent]))
+        else :
+            nv=len(verts)
+            roots.add(bp)
+            rootindices.append(n)
+        bp.index=n
+        
+    timings.add('skeleton')
+    
+    # native skinning method
+    if nomodifiers == False and skinmethod == 'NATIVE': 
+        # add a quad edge loop to all roots
+        for r in roots:
+            simpleskin(r, verts, faces, radii, power, scale, p)
+            
+    # end of native skinning section
+    timings.add('nativeskin')
+    
+    # create the (skinned) tree mesh
+    mesh = bpy.data.meshes.new('Tree')
+    mesh.from_pydata(verts, edges, faces)
+    mesh.update(calc_edges=True)
+    
+    # create the tree object an make it the only selected and active object in the scene
+    obj_new = bpy.data.objects.new(mesh.name, mesh)
+    obj_new.location = cursor
+    base = bpy.context.scene.objects.link(obj_new)
+    for ob in bpy.context.scene.objects:
+        ob.select = False
+    base.select = True
+    bpy.context.scene.objects.active = obj_new
+    
+    # remember what updateGeometry() needs to change the appearance of this tree in place
+    if radii:
+        mesh['connections'] = radii
+    obj_new['spacetree'] = {'skeleton': len(branchpoints), 'power': power, 'scale': scale, 'bleaf': bleaf, 'emitterscale': emitterscale}
+    
+    # add a leaves vertex group
+    leavesgroup = get_vertex_group(obj_new, 'Leaves')
+    
+    setWeights(leavesgroup, radii, bleaf, maxRadius(radii, 0.03))
+    timings.add('createmesh')
+    
+    # add a subsurf modifier to smooth the branches 
+    if nomodifiers == False:
+        if subsurface:
+            modifier = obj_new.modifiers.new('Subsurf', 'SUBSURF')
+            modifier.levels = 1
+            modifier.render_levels = 1
+            modifier.use_subsurf_uv = True
+
+        # add a skin modifier (adding it also adds the skin vertices layer to the mesh)
+        if skinmethod == 'BLENDER':
+            modifier = obj_new.modifiers.new('Skin', 'SKIN')
+            modifier.use_smooth_shade=True
+            modifier.use_x_symmetry=True
+            modifier.use_y_symmetry=True
+            modifier.use_z_symmetry=True
+
+            # set the x and y radius of all skin vertices and mark the roots in bulk
+            skinverts = obj_new.data.skin_vertices[0].data
+            skinradius = {r:(r**power)*scale for r in set(radii)} # radii are numbers of connections, so there are few distinct values
+            skinverts.foreach_set('radius', array('f', (skinradius[r] for r in radii for xy in (0,1))))
+            useroot = [False]*len(skinverts)
+            for i in rootindices:
+                useroot[i] = True
+            skinverts.foreach_set('use_root', useroot)
+            
+            # add an extra subsurf modifier to smooth the skin
+            modifier = obj_new.modifiers.new('Subsurf', 'SUBSURF')
+            modifier.levels = 1
+            modifier.render_levels = 2
+            modifier.use_subsurf_uv = True
+
+    timings.add('modifiers')
+
+    # create a particles based leaf emitter (if we have leaves and/or objects)
+    if leafParticles != 'None' or objectParticles != 'None':
+        mesh, nfaces, radii = createLeaves2(branchpoints, p, emitterscale, leafconnections)
+        if radii:
+            mesh['connections'] = radii.tolist()
+        obj_leaves2 = bpy.data.objects.new(mesh.name, mesh)
+        base = bpy.context.scene.objects.link(obj_leaves2)
+        # the emitter mesh is relative to the tree as well, so parenting puts its origin at the 3D cursor too
+        obj_leaves2.parent = obj_new
+        # add a LeafDensity vertex group to the LeafEmitter object
+        leavesgroup = get_vertex_group(obj_leaves2, 'LeafDensity')
+        setWeights(leavesgroup, radii, bleaf, maxRadius(radii, 1.0))
+
+        # adding a particle system modifier adds a particle system as well
+        if leafParticles in particlesettings:
+            psys = obj_leaves2.modifiers.new('Leaves', 'PARTICLE_SYSTEM').particle_system
+            psys.settings = particlesettings[leafParticles]
+            psys.settings.count = nfaces
+            psys.name = 'Leaves'
+            psys.vertex_group_density = leavesgroup.name
+        if objectParticles in particlesettings:
+            psys = obj_leaves2.modifiers.new('Objects', 'PARTICLE_SYSTEM').particle_system
+            psys.settings = particlesettings[objectParticles]
+            psys.settings.count = nfaces
+            psys.name = 'Objects'
+            psys.vertex_group_density = leavesgroup.name
+        
+    polygons = obj_new.data.polygons
+    polygons.foreach_set('use_smooth', [True]*len(polygons))
+    
+    timings.add('leaves')
+    
+    if timeperf and profile is None:
+        print(timings)
+        
+    return obj_new
+    
+# the corners of the triangle of basictri() for a radius of 1. The corners of a triangle add up to zero,
+# so the centre of a triangle, where its branchpoint is, is the average of its corners
+unittriangle = ((-1,0,0), (0.5,-0.866,0), (0.5,0.866,0))
+
+def updateGeometry(obj, power, scale, bleaf, emitterscale, profile=None):
+    """
+    change the appearance of a tree object created by createGeometry() in place: the native skin and the skin
+    modifier radii (power and scale) and the Leaves weights (bleaf) of the tree, and the vertices (emitterscale)
+    and LeafDensity weights (bleaf) of its leaf emitter. The topology does not change, so the coordinates and
+    radii are rewritten with foreach_set() and the weights with a call per distinct radius.
+    Return False if obj was not created by createGeometry().
+    """
+    from .utils import get_vertex_group
+    timings = Timer() if profile is None else profile
+    mesh = obj.data
+    if 'spacetree' not in obj or not isinstance(mesh, bpy.types.Mesh) or 'connections' not in mesh:
+        return False
+    radii = mesh['connections'].to_list()
+    nskeleton = obj['spacetree']['skeleton']
+    
+    # every branchpoint got a triangle of the native skin, after the vertices of the skeleton
+    if len(mesh.vertices) > nskeleton:
+        co = array('f', [0.0])*(len(mesh.vertices)*3)
+        mesh.vertices.foreach_get('co', co)
+        skinradius = {r:(r**power)*scale for r in set(radii)}
+        for i in range(nskeleton*3, len(co), 9):
+            x = (co[i  ]+co[i+3]+co[i+6])/3
+            y = (co[i+1]+co[i+4]+co[i+7])/3
+            z = (co[i+2]+co[i+5]+co[i+8])/3
+            r = skinradius[radii[i//3]]
+            for k,(dx,dy,dz) in enumerate(unittriangle):
+                co[i+k*3  ] = x+dx*r
+                co[i+k*3+1] = y+dy*r
+                co[i+k*3+2] = z+dz*r
+        mesh.vertices.foreach_set('co', co)
+    if len(mesh.skin_vertices):
+        skinradius = {r:(r**power)*scale for r in set(radii)}
+        mesh.skin_vertices[0].data.foreach_set('radius', array('f', (skinradius[r] for r in radii for xy in (0,1))))
+    setWeights(get_vertex_group(obj, 'Leaves'), radii, bleaf, maxRadius(radii, 0.03))
+    mesh.update()
+    timings.add('updatetree')
+    
+    for child in obj.children:
+        mesh = child.data
+        if not isinstance(mesh, bpy.types.Mesh) or 'connections' not in mesh or 'LeafDensity' not in child.vertex_groups:
+            continue
+        # a leaf emitter: a prism around every branchpoint with leaves, whose first three corners make a triangle
+        radii = mesh['connections'].to_list()
+        corners = prismCorners(emitterscale)
+        co = array('f', [0.0])*(len(mesh.vertices)*3)
+        mesh.vertices.foreach_get('co', co)
+        for i in range(0, len(co), 18):
+            x = (co[i  ]+co[i+3]+co[i+6])/3
+            y = (co[i+1]+co[i+4]+co[i+7])/3
+            z = (co[i+2]+co[i+5]+co[i+8])/3
+            for k,(dx,dy,dz) in enumerate(corners):
+                co[i+k*3  ] = x+dx
+                co[i+k*3+1] = y+dy
+                co[i+k*3+2] = z+dz
+        mesh.vertices.foreach_set('co', co)
+        setWeights(child.vertex_groups['LeafDensity'], radii, bleaf, maxRadius(radii, 1.0))
+        mesh.update()
+    timings.add('updateleaves')
+    
+    obj['spacetree'].update({'power': power, 'scale': scale, 'bleaf': bleaf, 'emitterscale': emitterscale})
+    return True
+
+class SCATree(bpy.types.Operator):
+    bl_idname = "mesh.sca_tree"
+    bl_label = "SCATree"
+    bl_options = {'REGISTER', 'UNDO', 'PRESET'}
+
+    internodeLength = FloatProperty(name="Internode Length",
+                    description="Internode length in Blender Units",
+                    default=0.75,
+                    min=0.01,
+                    soft_max=3.0,
+                    subtype='DISTANCE',
+                    unit='LENGTH')
+    killDistance = FloatProperty(name="Kill Distance",
+                    description="Kill Distance as a multiple of the internode length",
+                    default=3,
+                    min=0.01,
+                    soft_max=100.0)
+    influenceRange = FloatProperty(name="Influence Range",
+                    description="Influence Range as a multiple of the internode length",
+                    default=15,
+                    min=0.01,
+                    soft_max=100.0)
+    tropism = FloatProperty(name="Tropism",
+                    description="The tendency of branches to bend up or down",
+                    default=0,
+                    min=-1.0,
+                    soft_max=1.0)
+    power = FloatProperty(name="Branch tapering",
+                    description="How fast a branch tapers off as it splits",
+                    default=0.3,
+                    min=0.01,
+                    soft_max=1.0)
+    scale = FloatProperty(name="Branch diameter",
+                    description="Branch base diameter (gets smaller near the tips)",
+                    default=0.01,
+                    min=0.0001,
+                    soft_max=1.0)
+    
+    # the group related properties are not saved as presets because on reload no groups with the same names might exist, causing an exception
+    useGroups = BoolProperty(name="Use object groups",
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    description="Use groups of objects to specify marker distribution",
+                    default=False)
+    
+    crownGroup = EnumProperty(items=availableGroupsOrNone,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Crown Group',
+                    description='Group of objects that specify crown shape')
+    
+    shadowGroup = EnumProperty(items=availableGroupsOrNone,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Shadow Group',
+                    description='Group of objects subtracted from the crown shape')
+    shadowDensity = FloatProperty(name="Shadow density",
+                    description="Shadow density, bigger means less markers in shadow group volume",
+                    default=0.5,
+                    min=0.0,
+                    max=1.0)
+    
+    exclusionGroup = EnumProperty(items=availableGroupsOrNone,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Exclusion Group',
+                    description='Group of objects that will not be penetrated by growing branches')
+    
+    useTrunkGroup = BoolProperty(name="Use trunk group", 
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    description="Use the locations of a group of objects to specify trunk starting points instead of 3d cursor",
+                    default=False)
+    
+    trunkGroup = EnumProperty(items=availableGroups,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Trunk Group',
+                    description='Group of objects whose locations specify trunk starting points')
+    
+    separateTrees = BoolProperty(name="Separate trees",
+                    description="Create a separate object for each trunk (the trunks still compete for the same markers)",
+                    default=False)
+    
+    crownSize = FloatProperty(name="Crown Size",
+                    description="Crown size",
+                    default=5,
+                    min=1,
+                    soft_max=29)
+    crownShape = FloatProperty(name="Crown Shape",
+                    description="Crown shape",
+                    default=1,
+                    min=0.2,
+                    soft_max=5)
+    crownOffset = FloatProperty(name="Crown Offset",
+                    description="Crown offset (the length of the bole)",
+                    default=3,
+                    min=0,
+                    soft_max=20.0)
+    surfaceBias = FloatProperty(name="Surface Bias",
+                    description="Surface bias (how much markers are favored near the surface)",
+                    default=1,
+                    min=0.1,
+                    soft_max=10)
+    topBias = FloatProperty(name="Top Bias",
+                    description="Top bias (how much markers are favored near the top)",
+                    default=1,
+                    min=0.1,
+                    soft_max=10)
+    randomSeed = IntProperty(name="Random Seed",
+                    description="The seed governing random generation",
+                    default=0,
+                    min=0)
+    maxIterations = IntProperty(name="Maximum Iterations",
+                    description="The maximum number of iterations allowed for tree generation",
+                    default=40,
+                    min=0)
+    pruningGen = IntProperty(name="Pruning Generation",
+                    description="Prune branches last touched in this generation (0 won't prune anythin)",
+                    default=0,
+                    min=0)
+    numberOfEndpoints = IntProperty(name="Number of Endpoints",
+                    description="The number of endpoints generated in the growing volume",
+                    default=100,
+                    min=0)
+    newEndPointsPer1000 = IntProperty(name="Number of new Endpoints",
+                    description="The number of new endpoints generated in the growing volume per thousand iterations",
+                    default=0,
+                    min=0)
+    maxTime = FloatProperty(name="Maximum Time",
+                    description=("The maximum time to run the generation for "
+                                "in seconds (0.0 = Disabled). Checked after each generation"),
+                    default=0.0,
+                    min=0.0,
+                    soft_max=10)
+    stallGenerations = IntProperty(name="Stop After Stalling",
+                    description="Stop when this many consecutive generations did not add new branches (0 = Disabled)",
+                    default=0,
+                    min=0,
+                    soft_max=20)
+    bLeaf = FloatProperty(name="Leaf clustering",
+                    description=("How much leaves cluster to the end of the internode"),
+                    default=1,
+                    min=0,
+                    soft_min=0.3,
+                    soft_max=4)
+
+    addLeaves = BoolProperty(name="Add Leaves & Objects", default=False)
+    leafParticles = EnumProperty(items=availableParticleSettings,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Leaf distribution',
+                    description='Settings for a leaf particle system')
+    objectParticles = EnumProperty(items=availableParticleSettings,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Additional object distribution',
+                    description='Settings for a extra particle system')
+    emitterScale = FloatProperty(name="Emitter scale",
+                    description="Leaf emitter scale (will not be rendered anyway)",
+                    default=0.01,
+                    min=0.0001,
+                    soft_max=1.0)
+    leafConnections = IntProperty(name="Leaf Connections",
+                    description="Only branchpoints with at most this many connections get leaves (0 = all branchpoints)",
+                    default=0,
+                    min=0,
+                    soft_max=50)
+    
+    barkMaterial = EnumProperty(items=availableBarkMaterials,
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Bark material',
+                    description='Bark material to use on branches')
+    
+    updateTree = BoolProperty(name="Update Tree", default=False)
+    
+    noModifiers = BoolProperty(name="No Modifers", default=True)
+    subSurface = BoolProperty(name="Sub Surface", default=False, description="Add subsurface modifier to trunk skin")
+    skinMethod = EnumProperty(items=[('NATIVE','Space tree','Spacetrees own skinning method',1),('BLENDER','Skin modifier','Use Blenders skin modifier',2)],
+                    options={'ANIMATABLE','SKIP_SAVE'},
+                    name='Skinning method',
+                    description='How to add a surface to the trunk skeleton')
+    
+    showMarkers = BoolProperty(name="Show Markers", default=False)
+    markerType = EnumProperty(items=[('MESH', 'Tetrahedra', 'A mesh with a tetrahedron for every marker'),
+                        ('POINTS', 'Points', 'A vertex only mesh with a vertex for every marker and a vertex group per marker state (Alive, TooFar, Dead)'),
+                        ('INSTANCES', 'Instanced', 'Like Points, with a tetrahedron instanced on every vertex for display')],
+                    name='Marker Type',
+                    description='How to show the markers',
+                    default='MESH')
+    markerScale = FloatProperty(name="Marker Scale",
+                    description=("The size of the markers"),
+                    default=0.05,
+                    min=0.001,
+                    soft_max=0.2)
+    useService = BoolProperty(name="Use Service",
+                    description=("Grow the skeleton in a running generation service (python -m add_mesh_space_tree.service), "
+                                "if it can grow it: not with object groups or markers shown"),
+                    default=False)
+    timePerformance = BoolProperty(name="Time performance", default=False, description="Show duration of generation steps on console")
+    profilePath = StringProperty(name="Profile",
+                    options={'SKIP_SAVE'},
+                    description=("Write timings and per generation counters to this file "
+                                "(in Chrome trace format if it ends in .trace.json)"),
+                    default="",
+                    subtype='FILE_PATH')
+
+    apicalcontrol = FloatProperty(name="Apical Control",
+                    description=("The amount of apical control"),
+                    default=0.0,
+                    min=0.0,
+                    soft_max=0.8)    
+    apicalcontrolfalloff = FloatProperty(name="Apical Falloff",
+                    description=("Fallof along branch. Values < 1 will ease falloff, > 1 will sharpen it"),
+                    default=1.0,
+                    min=0.0,
+                    soft_max=2)    
+    apicalcontroltiming = IntProperty(name="Apical Timing",
+                    description=("Maximum number of generations with apical control. 0 = always."),
+                    default=10,
+                    min=0,
+                    soft_max=40)    
+
+    @classmethod
+    def poll(self, context):
+        # Check if we are in object mode
+        return context.mode == 'OBJECT'
+
+    def loadLibraries(self):
+        # this operator has UNDO as attribute so library loads get undone as well if we redo the operator and
+        # references to the loaded datablocks would be stale (and crash Blender). So on every execute() we look up
+        # the datablocks again by name and only load the library again if any of them is actually gone.
+        from .utils import load_cached, load_materials_from_bundled_lib, load_particlesettings_from_bundled_lib
+        global barkmaterials
+        barkmaterials = load_cached(librarycache, 'materials', bpy.data.materials,
+            partial(load_materials_from_bundled_lib, 'add_mesh_space_tree', 'material_lib.blend', 'Bark'))
+        bpy.types.MESH_OT_sca_tree.barkmaterials = barkmaterials
+        
+        global particlesettings
+        particlesettings = load_cached(librarycache, 'particles', bpy.data.particles,
+            partial(load_particlesettings_from_bundled_lib, 'add_mesh_space_tree', 'material_lib.blend', 'LeafEmitter'))
+        bpy.types.MESH_OT_sca_tree.particlesettings = particlesettings
+        
+        if not barkmaterials or not particlesettings:
+            self.report({'WARNING'}, "Could not load the bark materials and leaf particle settings from material_lib.blend")
+
+    def createSCA(self, context, timings):
+        """return a new SCA object, set up according to the operator properties (no growth has taken place yet)."""
+        # ray casts toward an object that is being edited may fail, so leave edit mode (only then, because
+        # like every operator mode_set triggers a scene update)
+        if context.active_object is not None and context.active_object.mode != 'OBJECT':
+            try:
+                bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+            except RuntimeError:
+                pass
+        
+        if self.useGroups:
+            size,minp = groupExtends(self.crownGroup)
+            volumefie=partial(groupdistribution,self.crownGroup,self.shadowGroup,self.shadowDensity,self.randomSeed,size,minp-bpy.context.scene.cursor_location)
+        else:
+            from .scanew import ellipsoid2
+            volumefie=partial(ellipsoid2,self.crownSize*self.crownShape,self.crownSize,Vector((0,0,self.crownSize+self.crownOffset)),self.surfaceBias,self.topBias)
+        
+        # exclusion is checked for all new internodes of a generation at once, with a single ray per internode.
+        # An exclusion group applies whether or not the crown is defined by object groups
+        exclude = lambda p: False
+        excludesegments = None
+        if bpy.data.groups.find(self.exclusionGroup)>=0:
+            exclude = partial(insidegroup, group=self.exclusionGroup) # for the shoots of the starting points, see SCA
+            excludesegments = partial(segmentsinsidegroup, group=self.exclusionGroup)
+        
+        startingpoints = []
+        if self.useTrunkGroup:
+            if bpy.data.groups.find(self.trunkGroup)>=0 :
+                for ob in bpy.data.groups[self.trunkGroup].objects :
+                    startingpoints.append(ob.location - context.scene.cursor_location)
+        
+        from .scanew import SCA
+        timings.add('scastart')
+        sca = SCA(NBP = self.maxIterations,
+            NENDPOINTS=self.numberOfEndpoints,
+            d=self.internodeLength,
+            KILLDIST=self.killDistance,
+            INFLUENCE=self.influenceRange,
+            SEED=self.randomSeed,
+            TROPISM=self.tropism,
+            volume=volumefie,
+            exclude=exclude,
+            excludesegments=excludesegments,
+            startingpoints=startingpoints,
+            apicalcontrol=self.apicalcontrol,
+            apicalcontrolfalloff=self.apicalcontrolfalloff,
+            apicaltiming=self.apicalcontroltiming,
+            observer=timings if self.timePerformance else None
+            )
+        timings.add('sca')
+        return sca
+
+    def createTree(self, context, sca, timings):
+        """create the tree objects from a fully grown SCA object."""
+        self.growthinfo = "Stopped after %d generations: %s"%(sca.generations, sca.stopreason)
+        self.report({'INFO'}, self.growthinfo)
+        
+        if self.showMarkers:
+            if self.markerType == 'MESH':
+                mesh = createMarkers(sca, self.markerScale)
+                obj_markers = bpy.data.objects.new(mesh.name, mesh)
+                base = bpy.context.scene.objects.link(obj_markers)
+            else:
+                mesh = createMarkerPoints(sca)
+                obj_markers = bpy.data.objects.new(mesh.name, mesh)
+                base = bpy.context.scene.objects.link(obj_markers)
+                addMarkerGroups(obj_markers, sca)
+                if self.markerType == 'INSTANCES':
+                    mesh = createMarkerInstance(self.markerScale)
+                    obj_instance = bpy.data.objects.new(mesh.name, mesh)
+                    bpy.context.scene.objects.link(obj_instance)
+                    obj_instance.parent = obj_markers
+                    obj_markers.dupli_type = 'VERTS'
+        timings.add('showmarkers')
+        
+        # in forest mode each trunk becomes a separate object, otherwise all trunks end up in a single mesh
+        treeindices = range(sca.ntrees) if self.useTrunkGroup and self.separateTrees else [None]
+        for treeindex in treeindices:
+            obj_new=createGeometry(sca,self.power,self.scale,
+                self.noModifiers, self.skinMethod, self.subSurface,
+                self.bLeaf, 
+                self.leafParticles if self.addLeaves else 'None', 
+                self.objectParticles if self.addLeaves else 'None',
+                self.emitterScale,
+                self.timePerformance,
+                self.pruningGen,
+                timings if self.timePerformance else None,
+                treeindex,
+                self.leafConnections)
+            
+            if self.barkMaterial in barkmaterials:
+                obj_new.data.materials.append(barkmaterials[self.barkMaterial])
+        
+        if self.showMarkers:
+            obj_markers.parent = obj_new
+        
+        self.updateTree = False
+        
+        if self.timePerformance:
+            timings.add('Total')
+            print(timings)
+            if self.profilePath != "":
+                timings.save(bpy.path.abspath(self.profilePath))
+        
+        self.timings = timings
+        
+        return {'FINISHED'}
+
+    # properties that only affect the geometry created from a skeleton, not the growth of the skeleton itself
+    appearance = {'power', 'scale', 'bLeaf', 'addLeaves', 'leafParticles', 'objectParticles', 'emitterScale', 'leafConnections',
+        'barkMaterial', 'noModifiers', 'subSurface', 'skinMethod', 'pruningGen', 'separateTrees', 'showMarkers',
+        'markerType', 'markerScale', 'timePerformance', 'profilePath', 'updateTree', 'previewEvery', 'useService', 'rna_type'}
+
+    def growthKey(self, context):
+        """return a hashable summary of everything the growth of the skeleton depends on."""
+        properties = tuple((p.identifier, getattr(self, p.identifier)) for p in self.rna_type.properties
+            if p.identifier not in self.appearance)
+        objects = []
+        groups = [self.exclusionGroup]
+        if self.useGroups:
+            groups += [self.crownGroup, self.shadowGroup]
+        if self.useTrunkGroup:
+            groups.append(self.trunkGroup)
+        for group in groups:
+            if bpy.data.groups.find(group) < 0 : continue
+            for ob in bpy.data.groups[group].objects:
+                objects.append((group, ob.name, tuple(c for row in ob.matrix_world for c in row),
+                    len(ob.data.vertices) if isinstance(ob.data, bpy.types.Mesh) else 0))
+        return properties, tuple(context.scene.cursor_location), tuple(objects)
+
+    def serviceClient(self):
+        """return a connection to the generation service if Use Service is set and it can grow this tree, else None."""
+        # the service grows without the scene, so no object groups, and only returns the skeleton, so no markers
+        if not self.useService or self.useGroups or self.useTrunkGroup or self.showMarkers:
+            return None
+        if bpy.data.groups.find(self.exclusionGroup)>=0:
+            return None
+        from .service import connect
+        return connect()
+
+    def serviceSpec(self):
+        from .batch import DEFAULTS
+        return {name:getattr(self, name) for name in DEFAULTS}
+
+    def execute(self, context):
+        
+        self.loadLibraries()
+        
+        if not self.updateTree:
+            return {'PASS_THROUGH'}
+        
+        # if only the appearance changed (e.g. power, scale or the leaf settings) the last skeleton is reused
+        # (to change power, scale, bLeaf or emitterScale of an existing tree in place see SCATreeAppearance)
+        key = self.growthKey(context)
+        sca = lastgrowth.get('sca') if lastgrowth.get('key') == key else None
+        if 'sca' in pregrown:
+            sca = pregrown.pop('sca')
+            sca.buildResults()
+        # a skeleton grown by the generation service has no markers to show, so grow one here instead
+        if sca is not None and self.showMarkers and not hasattr(sca, 'epall'):
+            sca = None
+
+        # a Profile records nested timings and per generation counters besides the labeled timestamps of a Timer
+        timings=Profile() if self.timePerformance else Timer()
+        
+        if sca is None:
+            client = self.serviceClient()
+            if client is not None:
+                try:
+                    sca = client.grow(self.serviceSpec())
+                    sca.buildResults()
+                    timings.add('service')
+                except (RuntimeError, EOFError, OSError) as e:
+                    # an error reply, or the service went away
+                    self.report({'WARNING'}, "The generation service failed, growing here instead: %s"%e)
+                finally:
+                    client.close()
+        if sca is None:
+            sca = self.createSCA(context, timings)
+            sca.iterate(newendpointsper1000=self.newEndPointsPer1000,maxtime=self.maxTime,patience=self.stallGenerations)
+            timings.add('iterate')
+        if lastgrowth.get('sca') is not sca:
+            lastgrowth['key'], lastgrowth['sca'] = key, sca
+        else:
+            timings.add('reuse')
+        
+        return self.createTree(context, sca, timings)
+
+    def draw(self, context):
+        layout = self.layout
+
+        layout.prop(self, 'updateTree', icon='MESH_DATA')
+
+        columns=layout.row()
+        col1=columns.column()
+        col2=columns.column()
+        
+        box = col1.box()
+        box.label("Generation Settings:")
+        box.prop(self, 'randomSeed')
+        box.prop(self, 'maxIterations')
+        box.prop(self, 'maxTime')
+        box.prop(self, 'stallGenerations')
+        box.prop(self, 'useService')
+        if hasattr(self, 'growthinfo'):
+            box.label(self.growthinfo)
+
+        box = col1.box()
+        box.label("Shape Settings:")
+        box.prop(self, 'numberOfEndpoints')
+        box.prop(self, 'internodeLength')
+        box.prop(self, 'influenceRange')
+        box.prop(self, 'killDistance')
+        box.prop(self, 'tropism')
+        box.prop(self, 'apicalcontrol')
+        if self.apicalcontrol > 0:
+            box.prop(self, 'apicalcontrolfalloff')
+            box.prop(self, 'apicalcontroltiming')
+        box.prop(self, 'pruningGen')
+        
+        newbox = col2.box()
+        newbox.label("Crown shape")
+        newbox.prop(self,'useGroups')
+        if self.useGroups:
+            newbox.label("Object groups defining crown shape")
+            groupbox = newbox.box()
+            groupbox.prop(self,'crownGroup')
+            groupbox = newbox.box()
+            groupbox.alert=(self.shadowGroup != 'None' and self.shadowGroup == self.crownGroup)
+            groupbox.prop(self,'shadowGroup')
+            groupbox.prop(self,'shadowDensity')
+            groupbox = newbox.box()
+            groupbox.alert=(self.exclusionGroup != 'None' and self.exclusionGroup == self.crownGroup)
+            groupbox.prop(self,'exclusionGroup')
+        else:
+            newbox.label("Simple ellipsoid defining crown shape")
+            newbox.prop(self, 'crownSize')
+            newbox.prop(self, 'crownShape')
+            newbox.prop(self, 'crownOffset')
+            newbox.label("Distribution bias of new endpoints added while iterating")
+            newbox.prop(self, 'surfaceBias')
+            newbox.prop(self, 'topBias')
+        newbox = col2.box()
+        newbox.prop(self,'useTrunkGroup')
+        if self.useTrunkGroup:
+            newbox.prop(self,'trunkGroup')
+            newbox.prop(self,'separateTrees')
+            
+        box.prop(self, 'newEndPointsPer1000')
+        
+        box = col2.box()
+        box.label("Skin options:")
+        box.prop(self, 'noModifiers')
+        if not self.noModifiers:
+            box.prop(self, 'skinMethod')
+            box.prop(self, 'subSurface')
+            box.prop(self, 'power')
+            box.prop(self, 'scale')
+            box.prop(self, 'barkMaterial')
+            
+        box = layout.box()
+        box.prop(self, 'addLeaves')
+        if self.addLeaves:
+            box.prop(self,'bLeaf')
+            box.prop(self,'leafParticles')
+            box.prop(self,'objectParticles')
+            box.prop(self,'emitterScale')
+            box.prop(self,'leafConnections')
+
+        box = layout.box()
+        box.label("Debug Settings:")
+        box.prop(self, 'showMarkers')
+        if self.showMarkers:
+            box.prop(self, 'markerType')
+            if self.markerType != 'POINTS':
+                box.prop(self, 'markerScale')
+        box.prop(self, 'timePerformance')
+        if self.timePerformance:
+            box.prop(self, 'profilePath')
+            for line in str(self.timings).split('\n'):
+                box.label(line)
+        
+class SCATreeModal(SCATree):
+    """Add a tree, growing it a few generations at a time on the main thread so Blender stays mostly responsive (Esc cancels). A single slow generation still blocks the interface"""
+    bl_idname = "mesh.sca_tree_modal"
+    bl_label = "SCATree (interactive)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # maximum time in seconds spent growing per timer event, i.e. how long the user interface may be unresponsive
+    timeslice = 0.1
+
+    previewEvery = IntProperty(name="Preview Every",
+                    description="Update an edge only preview of the growing skeleton every this many generations (0 = no preview)",
+                    default=5,
+                    min=0,
+                    soft_max=20)
+
+    def invoke(self, context, event):
+        self.loadLibraries()
+        # growing happens on the main thread because the marker distribution and the exclusion tests may
+        # ray cast into scene objects, which is not safe to do from another thread
+        self.timings = Profile() if self.timePerformance else Timer()
+        self.growthkey = self.growthKey(context) # the scene may change while we grow
+        # with the generation service the whole skeleton grows there and we only poll for it, without a preview
+        self.client = self.serviceClient()
+        if self.client is not None:
+            self.client.submit(self.serviceSpec())
+            self.sca = self.preview = None
+        else:
+            self.growLocally(context)
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, max(self.maxIterations, 1))
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        # a redo (F6) runs execute() instead of invoke(), and should grow the tree again with the changed settings
+        self.updateTree = True
+        return SCATree.execute(self, context)
+
+    def growLocally(self, context):
+        self.sca = self.createSCA(context, self.timings)
+        self.growth = self.sca.grow(newendpointsper1000=self.newEndPointsPer1000,maxtime=self.maxTime,patience=self.stallGenerations)
+        self.preview = Preview() if self.previewEvery > 0 else None
+        self.previewed = 0 # generation of the last preview update
+
+    def stop(self, context):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        if context.area is not None:
+            context.area.header_text_set()
+        # the preview is replaced by the final tree (or discarded if cancelled)
+        if self.preview is not None:
+            self.preview.remove()
+            self.preview = None
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.stop(context)
+            self.report({'INFO'}, "Tree generation cancelled after %d generations"%(self.sca.generations if self.sca is not None else 0))
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        if self.client is not None:
+            try:
+                if not self.client.ready():
+                    if context.area is not None:
+                        context.area.header_text_set("Growing tree in the generation service (Esc to cancel)")
+                    return {'RUNNING_MODAL'}
+                sca = self.client.result()
+            except (RuntimeError, EOFError, OSError) as e:
+                # an error reply, or the service went away
+                self.report({'WARNING'}, "The generation service failed, growing here instead: %s"%e)
+                self.client.close()
+                self.client = None
+                self.growLocally(context)
+                return {'RUNNING_MODAL'}
+            self.stop(context)
+            self.timings.add('service')
+            sca.buildResults()
+            lastgrowth['key'], lastgrowth['sca'] = self.growthkey, sca
+            return self.createTree(context, sca, self.timings)
+
+        deadline = time() + self.timeslice
+        for generation in self.growth:
+            if time() > deadline:
+                break
+        else:
+            # growth has finished, build the mesh
+            self.stop(context)
+            self.timings.add('iterate')
+            self.sca.buildResults()
+            lastgrowth['key'], lastgrowth['sca'] = self.growthkey, self.sca
+            return self.createTree(context, self.sca, self.timings)
+
+        context.window_manager.progress_update(self.sca.generations)
+        if self.preview is not None and self.sca.generations - self.previewed >= self.previewEvery:
+            self.preview.update(self.sca)
+            self.previewed = self.sca.generations
+        if context.area is not None:
+            context.area.header_text_set("Growing tree: generation %d/%d, %d live markers, %d branchpoints (Esc to cancel)"%(
+                self.sca.generations, self.maxIterations, self.sca.liveEndPoints(), len(self.sca.bp)//3))
+        return {'RUNNING_MODAL'}
+
+    def draw(self, context):
+        SCATree.draw(self, context)
+        self.layout.prop(self, 'previewEvery')
+
+class SCATreeAppearance(bpy.types.Operator):
+    """Change the branch tapering and diameter, leaf clustering and emitter scale of the selected trees in place"""
+    bl_idname = "object.sca_tree_appearance"
+    bl_label = "SCATree Appearance"
+    # the redo of this operator undoes the previous update, which brings back the tree objects it changed
+    bl_options = {'REGISTER', 'UNDO'}
+
+    power = FloatProperty(name="Branch tapering",
+                    description="How fast a branch tapers off as it splits",
+                    default=0.3,
+                    min=0.01,
+                    soft_max=1.0)
+    scale = FloatProperty(name="Branch diameter",
+                    description="Branch base diameter (gets smaller near the tips)",
+                    default=0.01,
+                    min=0.0001,
+                    soft_max=1.0)
+    bLeaf = FloatProperty(name="Leaf clustering",
+                    description=("How much leaves cluster to the end of the internode"),
+                    default=1,
+                    min=0,
+                    soft_min=0.3,
+                    soft_max=4)
+    emitterScale = FloatProperty(name="Emitter scale",
+                    description="Leaf emitter scale (will not be rendered anyway)",
+                    default=0.01,
+                    min=0.0001,
+                    soft_max=1.0)
+    timePerformance = BoolProperty(name="Time performance", default=False, description="Show duration of update steps on console")
+
+    @classmethod
+    def poll(self, context):
+        return context.mode == 'OBJECT' and context.active_object is not None and 'spacetree' in context.active_object
+
+    def invoke(self, context, event):
+        # start from the settings the active tree was created or last updated with
+        built = context.active_object['spacetree']
+        self.power, self.scale, self.bLeaf, self.emitterScale = built['power'], built['scale'], built['bleaf'], built['emitterscale']
+        return self.execute(context)
+
+    def execute(self, context):
+        timings = Timer()
+        trees = [ob for ob in context.selected_objects if 'spacetree' in ob]
+        if context.active_object not in trees:
+            trees.append(context.active_object)
+        updated = sum(updateGeometry(ob, self.power, self.scale, self.bLeaf, self.emitterScale, timings) for ob in trees)
+        if updated == 0:
+            self.report({'WARNING'}, "No trees created by SCATree selected")
+            return {'CANCELLED'}
+        if self.timePerformance:
+            timings.add('Total')
+            print(timings)
+        return {'FINISHED'}
+
+def menu_func(self, context):
+    self.layout.operator(SCATree.bl_idname, text="Add Tree to Scene",
+                                                icon='PLUGIN').updateTree = True
+    self.layout.operator(SCATreeModal.bl_idname, text="Add Tree to Scene (interactive)",
+                                                icon='PLUGIN')
+
+def menu_func_appearance(self, context):
+    self.layout.operator(SCATreeAppearance.bl_idname, text="Tree Appearance", icon='PLUGIN')
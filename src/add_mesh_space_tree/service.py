@@ -0,0 +1,346 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: service.py
+#  a long running pool of warm growth workers that hands out skeletons in shared memory
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+A local generation service: a pool of worker processes that have imported the growth engine and compiled its
+kernels once, listening on a Unix socket (a named pipe on Windows) for specs to grow.
+
+A spec is a dict of SCATree operator properties, as in batch.py. A worker grows the skeleton and writes its
+arrays to a multiprocessing.shared_memory block, which the client maps instead of receiving a pickled copy:
+
+    python -m add_mesh_space_tree.service --workers 4 &
+
+    from add_mesh_space_tree.service import connect
+    client = connect()             # None if no service is running
+    skeleton = client.grow({'numberOfEndpoints': 500, 'randomSeed': 3})
+    skeleton.bp                    # a memoryview of the branchpoint positions in the shared block
+
+The block holds, for n branchpoints, the positions bp (3n doubles) followed by the parent indices bpp (-1 for a
+root), the generations bpg and the tree indices bpt (n ints each). The service unlinks the block as soon as the
+client has mapped it, so it disappears when the client drops the skeleton (or exits). With the Use Service
+option the SCATree operators grow their skeletons here when a service is running. SCATree itself waits for the
+reply, only SCATreeModal polls for it, and both convert the skeleton to Branchpoint objects (buildResults()) to
+build the mesh, so inside Blender the service saves the warm up of the growth engine rather than any copying.
+
+Both sides unpickle what comes over the connection, so every connection is authenticated (in both directions)
+with a random key that the service writes to a file only the user can read when it starts. On posix systems the
+socket and key live in a directory that must be owned by the user and closed to everyone else, by default in
+$XDG_RUNTIME_DIR.
+
+Requires python 3.8 or later for multiprocessing.shared_memory.
+"""
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+from array import array
+from multiprocessing import AuthenticationError, Pool, cpu_count
+from multiprocessing.connection import Listener, Client as Connection
+from threading import Thread
+from time import perf_counter
+
+from .export import Skeleton
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:
+    SharedMemory = None
+
+ENVIRONMENT = 'SPACETREE_SERVICE'
+
+def defaultaddress():
+    """return the address in the SPACETREE_SERVICE environment variable, or else one private to the current user."""
+    if ENVIRONMENT in os.environ:
+        return os.environ[ENVIRONMENT]
+    if sys.platform == 'win32':
+        import getpass
+        return r'\\.\pipe\spacetree-%s'%getpass.getuser()
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'spacetree', 'service')
+    return os.path.join(tempfile.gettempdir(), 'spacetree-%d'%os.getuid(), 'service')
+
+def keyfile(address):
+    """return the name of the file holding the key of the service at address."""
+    if sys.platform == 'win32':
+        # a named pipe has no directory, so the key goes to the (per user) local application data
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, 'spacetree', address.rsplit('\\', 1)[-1] + '.key')
+    return address + '.key'
+
+def checkprivate(path):
+    """raise PermissionError unless path is owned by the current user and inaccessible to others (posix only)."""
+    if os.name != 'posix' : return
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError("%s is not private to the current user"%path)
+
+def privatedirectory(directory):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    checkprivate(directory) # it may have been created by someone else
+
+def writekey(address):
+    """write a new random key for the service at address to its key file and return it."""
+    filename = keyfile(address)
+    privatedirectory(os.path.dirname(filename))
+    if os.path.lexists(filename):
+        os.remove(filename)
+    key = os.urandom(32)
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+def readkey(address):
+    """return the key of the service at address, raising OSError if there is none or it is not private."""
+    filename = keyfile(address)
+    checkprivate(os.path.dirname(filename))
+    checkprivate(filename)
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def available():
+    return SharedMemory is not None
+
+def warmup():
+    """pool initializer: import the growth engine and compile the kernels of the backend before the first request."""
+    from .batch import grow
+    grow({'numberOfEndpoints': 10, 'maxIterations': 2})
+
+def growshared(spec):
+    """grow the skeleton described by spec and return a reply with the name and layout of the shared block holding it."""
+    from .batch import grow
+    start = perf_counter()
+    sca = grow(spec)
+    n = len(sca.bp)//3
+    parts = (sca.bp, array('i', (-1 if p is None else p for p in sca.bpp)), array('i', sca.bpg), sca.bpt)
+    block = SharedMemory(create=True, size=sum(len(a)*a.itemsize for a in parts))
+    offset = 0
+    for a in parts:
+        size = len(a)*a.itemsize
+        block.buf[offset:offset+size] = memoryview(a).cast('B')
+        offset += size
+    block.close() # the block stays until the service unlinks it
+    return {'block': block.name, 'n': n, 'ntrees': sca.ntrees, 'generations': sca.generations,
+        'stopreason': sca.stopreason, 'seconds': perf_counter() - start, 'process': os.getpid()}
+
+def unlink(name):
+    try:
+        block = SharedMemory(name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+class Service:
+    """accepts connections and runs the grow requests they send in a pool of warm workers."""
+
+    def __init__(self, address=None, workers=0):
+        self.address = address or defaultaddress()
+        self.workers = workers or cpu_count()
+        self.pool = None
+        self.listener = None
+        self.running = False
+
+    def listen(self):
+        if connect(self.address) is not None:
+            raise RuntimeError("a service is already running at %s"%self.address)
+        if sys.platform != 'win32':
+            # besides the key, the directory keeps other users away from the socket
+            privatedirectory(os.path.dirname(self.address))
+            if os.path.lexists(self.address):
+                os.remove(self.address) # left behind by a service that did not stop cleanly
+        self.listener = Listener(self.address, authkey=writekey(self.address))
+
+    def serve(self):
+        """run the service until a client sends a stop request."""
+        if not available():
+            raise RuntimeError("the generation service needs multiprocessing.shared_memory (python 3.8 or later)")
+        self.listen()
+        if os.name == 'posix':
+            # the workers create the blocks and the service unlinks them, so they have to share a resource tracker
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        self.pool = Pool(self.workers, initializer=warmup)
+        self.running = True
+        print("serving %d workers at %s"%(self.workers, self.address), file=sys.stderr)
+        try:
+            while self.running:
+                try:
+                    conn = self.listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError):
+                    continue # a client without the key, or one that went away during the handshake
+                Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            self.pool.terminate()
+
+    def handle(self, conn):
+        """answer the requests of a single client until it disconnects."""
+        blocks = set() # handed out but not yet mapped by the client
+        try:
+            while True:
+                request = conn.recv()
+                op = request.get('op')
+                if op == 'grow':
+                    try:
+                        reply = self.pool.apply(growshared, (request['spec'],))
+                        blocks.add(reply['block'])
+                    except Exception as e:
+                        reply = {'error': "%s: %s"%(type(e).__name__, e)}
+                    conn.send(reply)
+                elif op == 'release':
+                    blocks.discard(request['block'])
+                    unlink(request['block'])
+                elif op == 'status':
+                    conn.send({'workers': self.workers, 'process': os.getpid()})
+                elif op == 'stop':
+                    self.running = False
+                    conn.send({})
+                    # wake up the accept() in serve()
+                    connect(self.address)
+                    return
+        except (EOFError, OSError):
+            pass # the client went away, possibly before its last reply
+        finally:
+            for name in blocks:
+                unlink(name)
+            conn.close()
+
+# blocks that could not be closed yet because slices of their views were still referenced somewhere
+unclosed = []
+
+def closeblocks():
+    for block in list(unclosed):
+        try:
+            block.close()
+            unclosed.remove(block)
+        except BufferError:
+            pass
+
+class SharedSkeleton(Skeleton):
+    """a Skeleton whose positions, generations and tree indices are views of a shared block filled by the service."""
+
+    def __init__(self, block, reply):
+        n = reply['n']
+        self.block = block
+        buf = block.buf
+        self.bp = buf[:24*n].cast('d')
+        self.bpp = [None if p < 0 else p for p in buf[24*n:28*n].cast('i')]
+        self.bpg = buf[28*n:32*n].cast('i')
+        self.bpt = buf[32*n:36*n].cast('i')
+        self.ntrees = reply['ntrees']
+        self.generations = reply['generations']
+        self.stopreason = reply['stopreason']
+        self.seconds = reply['seconds'] # spent growing in the service
+
+    def close(self):
+        if self.block is None : return
+        for view in (self.bp, self.bpg, self.bpt):
+            view.release()
+        unclosed.append(self.block)
+        self.block = None
+        closeblocks()
+
+    def __del__(self):
+        self.close()
+
+def attach(name):
+    """map an existing shared block without making this process responsible for unlinking it."""
+    try:
+        return SharedMemory(name, track=False) # python 3.13 and later
+    except TypeError:
+        block = SharedMemory(name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+class Client:
+    """a connection to a running service. Requests are answered in order, so submit() can be followed by
+    polling ready() (for example from a modal operator) before calling result()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def submit(self, spec):
+        self.conn.send({'op': 'grow', 'spec': spec})
+
+    def ready(self):
+        return self.conn.poll()
+
+    def result(self):
+        """return the SharedSkeleton of the oldest submitted spec, waiting for it if needed."""
+        reply = self.conn.recv()
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        block = attach(reply['block'])
+        self.conn.send({'op': 'release', 'block': reply['block']})
+        return SharedSkeleton(block, reply)
+
+    def grow(self, spec):
+        self.submit(spec)
+        return self.result()
+
+    def status(self):
+        self.conn.send({'op': 'status'})
+        return self.conn.recv()
+
+    def stop(self):
+        self.conn.send({'op': 'stop'})
+        self.conn.recv()
+
+    def close(self):
+        self.conn.close()
+
+def connect(address=None):
+    """return a Client connected to the service at address (by default defaultaddress()), or None if none is running."""
+    if not available():
+        return None
+    address = address or defaultaddress()
+    try:
+        return Client(Connection(address, authkey=readkey(address)))
+    except (OSError, EOFError, AuthenticationError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m add_mesh_space_tree.service', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--address', help='the socket (or named pipe) to listen on, default %s'%defaultaddress())
+    parser.add_argument('--workers', type=int, default=0, help='the number of worker processes (0 = one per cpu)')
+    parser.add_argument('--stop', action='store_true', help='stop the service running at the address and exit')
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        client = connect(args.address)
+        if client is None:
+            print("no service running", file=sys.stderr)
+            return 1
+        client.stop()
+        return 0
+    Service(args.address, args.workers).serve()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  SCA Tree Generator, a Blender addon
+#  (c) 2013, 2014 Michel J. Anders (varkenvarken)
+#
+#  This module is: tiles.py
+#  a spatially partitioned version of the space colonization algorithm that grows in parallel processes
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+TiledSCA grows very large crowns and hedges by dividing the endpoints (markers) over tiles
+(columns in the xy plane) that live in separate worker processes.
+
+The master process holds the branchpoints, applies apical control and exclusion and decides where new
+branchpoints grow. Each tile holds its own endpoints plus a copy of every branchpoint within its halo,
+the tile extended by max(influence, killdistance). Branchpoints outside the halo can neither kill an endpoint
+of the tile nor bring it within influence range, so the tiles behave exactly like a single SCA would.
+
+Each generation the workers return, per branchpoint, the partial sum of the normalized directions of
+the endpoints assigned to it. The master adds these up, grows the new branchpoints and sends them back
+to the workers, which update their endpoints.
+
+Because workers are separate processes this is meant for headless use (benchmarks, batch generation)
+and not from within the Blender user interface.
+"""
+
+from array import array
+from math import sqrt, floor, isinf
+from multiprocessing import Pipe, Process, cpu_count
+
+from .mathutils_shim import install
+install()
+
+from .kernels import getbackend
+from .scanew import SCA
+
+class Tile:
+    """the endpoints of a single tile and the branchpoints in its halo."""
+
+    def __init__(self, box, killdistance, influence, ftype='d', kernels=None):
+        self.x0, self.y0, self.x1, self.y1 = box # halo bounds
+        self.killdistance = killdistance
+        self.influence = influence
+        self.ftype = ftype # 'f' in low memory mode, see SCA
+        self.kernels = kernels or getbackend()
+        self.bp = array('d')  # positions of the branchpoints in the halo
+        self.bpc = array('i') # number of children of those branchpoints
+        self.gid = array('i') # their global index
+        self.local = {}       # global index -> local index
+        self.nfree = 0        # number of branchpoints with less than two children
+        self.ep = array(ftype)
+        self.epv = array(ftype)
+        self.epd = array(ftype)
+        self.epb = array('i') # local index of the closest branchpoint, -1 = dead, -2 = out of range
+        self.epi = array('i') # the order in which the tile received its endpoints, as the compaction kernel keeps it
+        self.nadded = 0       # number of endpoints the tile received
+        self.ndead = 0        # number of endpoints killed since the last compaction
+        self.nnqueries = 0
+        self.nreassigned = 0
+        self.nkilled = 0
+
+    def inhalo(self, p):
+        return self.x0 <= p[0] <= self.x1 and self.y0 <= p[1] <= self.y1
+
+    def addLocal(self, gi, p, children=0):
+        bi = len(self.gid)
+        self.bp.extend(p)
+        self.bpc.append(children)
+        self.gid.append(gi)
+        self.local[gi] = bi
+        if children < 2 : self.nfree += 1
+        return bi
+
+    def closestBranchPoint(self, p):
+        self.nnqueries += 1
+        if self.nfree == 0 :
+            return -2, (0.0, 0.0, 0.0), 1e30
+        d2, bbi, bv = self.kernels.closest(self.bp, self.bpc, len(self.bpc), p[0], p[1], p[2])
+        d=sqrt(d2)
+        return bbi if d < self.influence else -2, (bv[0]/d,bv[1]/d,bv[2]/d), d
+
+    def addEndPoint(self, p):
+        bi, v, d = self.closestBranchPoint(p)
+        self.ep.extend(p)
+        self.epb.append(bi)
+        self.epv.extend(v)
+        self.epd.append(d)
+        self.epi.append(self.nadded)
+        self.nadded += 1
+
+    def addBranchPoint(self, gi, p, pgi):
+        """mirror SCA.addBranchPoint() for the endpoints in this tile."""
+        pi = self.local.get(pgi)
+        if pi is not None:
+            self.bpc[pi] += 1
+            if self.bpc[pi] == 2 : self.nfree -= 1
+        if self.inhalo(p):
+            bi = self.addLocal(gi, p)
+            killed = self.kernels.updateendpoints(self.ep, self.epv, self.epd, self.epb, p[0], p[1], p[2], bi, self.killdistance, self.influence)
+            self.ndead += killed
+            self.nkilled += killed
+        if pi is not None and self.bpc[pi] > 1:
+            epb = self.epb
+            for epi in range(len(epb)):
+                if epb[epi] == pi:
+                    bi, v, d = self.closestBranchPoint(self.ep[epi*3:epi*3+3])
+                    epb[epi]=bi
+                    self.epv[epi*3:epi*3+3]=array(self.ftype,v)
+                    self.epd[epi]=d
+                    self.nreassigned += 1
+
+    def compact(self):
+        """remove the dead endpoints in place, like SCA.compactEndPoints() once more than compactfraction of them is dead."""
+        if self.ndead == 0 : return
+        if self.ndead <= SCA.compactfraction * len(self.epb) : return
+        ep, epv, epd, epb, epi = self.ep, self.epv, self.epd, self.epb, self.epi
+        w = self.kernels.compactendpoints(ep, epv, epd, epb, epi)
+        del ep[w*3:], epv[w*3:], epd[w:], epb[w:], epi[w:]
+        self.ndead = 0
+
+    def directions(self, sums):
+        """add the normalized directions of the endpoints to the sums of their (global) branchpoints."""
+        epv, gid = self.epv, self.gid
+        for epi,bi in enumerate(self.epb):
+            if bi < 0 : continue
+            s = sums.get(gid[bi])
+            if s is None:
+                s = sums[gid[bi]] = [0.0, 0.0, 0.0]
+            s[0] += epv[epi*3]
+            s[1] += epv[epi*3+1]
+            s[2] += epv[epi*3+2]
+
+    def stats(self):
+        """return killed, reassigned, nnqueries, live and in range counts and reset the first three."""
+        result = (self.nkilled, self.nreassigned, self.nnqueries, len(self.epb) - self.ndead, sum(1 for bi in self.epb if bi >= 0))
+        self.nkilled = self.nreassigned = self.nnqueries = 0
+        return result
+
+def worker(conn, killdistance, influence, ftype, backend):
+    """the main loop of a worker process, executing the commands sent by a TiledSCA."""
+    kernels = getbackend(backend)
+    tiles = {}
+    while True:
+        command, args = conn.recv()
+        if command == 'tile':
+            key, box, bps = args
+            tile = tiles[key] = Tile(box, killdistance, influence, ftype, kernels)
+            for gi, x, y, z, children in bps:
+                tile.addLocal(gi, (x, y, z), children)
+            conn.send(None)
+        elif command == 'endpoints':
+            for key, positions in args.items():
+                tile = tiles[key]
+                for i in range(len(positions)//3):
+                    tile.addEndPoint(positions[i*3:i*3+3])
+            conn.send([sum(c) for c in zip((0,0,0,0,0), *(tile.stats() for tile in tiles.values()))])
+        elif command == 'directions':
+            sums = {}
+            for tile in tiles.values():
+                tile.directions(sums)
+            conn.send(sums)
+        elif command == 'branchpoints':
+            for tile in tiles.values():
+                for gi, x, y, z, pgi in args:
+                    tile.addBranchPoint(gi, (x, y, z), pgi)
+                tile.compact()
+            conn.send([sum(c) for c in zip((0,0,0,0,0), *(tile.stats() for tile in tiles.values()))])
+        elif command == 'stop':
+            conn.close()
+            return
+
+class TiledSCA(SCA):
+    """
+    an SCA whose endpoints are divided over tiles in worker processes, see the module docstring.
+
+    Besides the arguments of SCA it takes the number of worker processes (default: the number of cpus)
+    and the size of the (square) tiles (default: four times the halo size). The results are the same as
+    those of SCA, except for differences in the order in which floating point sums are added.
+    Call close() (iterate() does this automatically) to stop the workers.
+    """
+
+    def __init__(self, *args, workers=0, tilesize=0, **kwargs):
+        self.nworkers = workers if workers > 0 else cpu_count()
+        self.tilesize = tilesize
+        self.tiles = {}         # tile key -> index of the worker holding it
+        self.pending = array('d') # positions of endpoints not yet sent to a worker
+        self.newbranchpoints = [] # (index, x, y, z, parent index) not yet sent to the workers
+        self.workers = []
+        self.nlive = 0
+        self.ninrange = 0
+        SCA.__init__(self, *args, **kwargs)
+
+    def start(self):
+        self.halo = max(self.influence, self.killdistance)
+        if self.tilesize <= 0:
+            self.tilesize = 4*self.halo if not isinf(self.halo) and self.halo < 1e15 else 1e16
+        for w in range(self.nworkers):
+            conn, child = Pipe()
+            process = Process(target=worker, args=(child, self.killdistance, self.influence, self.ftype, self.kernels.name), daemon=True)
+            process.start()
+            self.workers.append((process, conn))
+
+    def close(self):
+        for process, conn in self.workers:
+            conn.send(('stop', None))
+            process.join()
+        self.workers = []
+
+    def tilekey(self, p):
+        return int(floor(p[0]/self.tilesize)), int(floor(p[1]/self.tilesize))
+
+    def newTile(self, key):
+        """assign a tile to a worker and send it the branchpoints in its halo."""
+        h, size = self.halo, self.tilesize
+        box = key[0]*size-h, key[1]*size-h, (key[0]+1)*size+h, (key[1]+1)*size+h
+        bp = self.bp
+        bps = [(bi, bp[bi*3], bp[bi*3+1], bp[bi*3+2], self.bpc[bi]) for bi in range(len(bp)//3)
+            if box[0] <= bp[bi*3] <= box[2] and box[1] <= bp[bi*3+1] <= box[3]]
+        w = len(self.tiles) % self.nworkers
+        self.tiles[key] = w
+        conn = self.workers[w][1]
+        conn.send(('tile', (key, box, bps)))
+        conn.recv()
+
+    def addEndPoint(self, ep):
+        # endpoints are sent to the workers in batches, the first batch when growing starts, see flush()
+        ep = tuple(ep)
+        self.epall.extend(ep)
+        self.pending.extend(ep)
+
+    def addBranchPoint(self, bp, pi, generation):
+        bi = self.appendBranchPoint(bp, pi, generation)
+        self.newbranchpoints.append((bi, bp[0], bp[1], bp[2], pi))
+
+    def collect(self, replies):
+        killed, reassigned, nnqueries, live, inrange = [sum(c) for c in zip((0,0,0,0,0), *replies)]
+        self.nkilled += killed
+        self.nreassigned += reassigned
+        self.nnqueries += nnqueries
+        self.nlive = live
+        self.ninrange = inrange
+
+    def flush(self):
+        """send pending endpoints and new branchpoints to the workers."""
+        if not self.workers:
+            self.start()
+        if self.newbranchpoints:
+            for process, conn in self.workers:
+                conn.send(('branchpoints', self.newbranchpoints))
+            self.collect([conn.recv() for process, conn in self.workers])
+            self.newbranchpoints = []
+        if self.pending:
+            pertile = {}
+            positions = self.pending
+            for i in range(len(positions)//3):
+                p = positions[i*3:i*3+3]
+                pertile.setdefault(self.tilekey(p), array('d')).extend(p)
+            perworker = [{} for w in self.workers]
+            for key, positions in pertile.items():
+                if key not in self.tiles:
+                    self.newTile(key)
+                perworker[self.tiles[key]][key] = positions if self.ftype == 'd' else array(self.ftype, positions)
+            for (process, conn), batch in zip(self.workers, perworker):
+                conn.send(('endpoints', batch))
+            self.collect([conn.recv() for process, conn in self.workers])
+            self.pending = array('d')
+
+    def growBranches(self, generation):
+        self.flush()
+        for process, conn in self.workers:
+            conn.send(('directions', None))
+        sums = {}
+        for process, conn in self.workers:
+            for bpi, v in conn.recv().items():
+                s = sums.get(bpi)
+                if s is None:
+                    sums[bpi] = v
+                else:
+                    s[0] += v[0]
+                    s[1] += v[1]
+                    s[2] += v[2]
+        self.nactive = len(sums)
+        newbps=[]
+        newbpps=[]
+        bpis = sorted(sums)
+        for bpi,suppressed in zip(bpis, self.suppressedShoots(bpis)):
+            if suppressed :
+                self.nsuppressed += 1
+                continue
+            v = sums[bpi]
+            d = sqrt(v[0]*v[0]+v[1]*v[1]+v[2]*v[2]) / self.branchlength
+            newbps.append((self.bp[bpi*3]+v[0]/d, self.bp[bpi*3+1]+v[1]/d, self.bp[bpi*3+2]+v[2]/d+self.tropism))
+            newbpps.append(bpi)
+        if len(newbps) == 0: return
+        self.addNewBranchPoints(newbps, newbpps, generation)
+        with self.observer.span('flush'):
+            self.flush()
+
+    def endpointStates(self):
+        """the states of the endpoints are only known to the workers (which stop after growing), so return None."""
+        return None
+
+    def hasLiveEndPoints(self):
+        return self.ninrange > 0
+
+    def counters(self, generation):
+        stats = SCA.counters(self, generation)
+        stats['liveendpoints'] = self.nlive
+        return stats
+
+    def iterate(self, *args, **kwargs):
+        try:
+            SCA.iterate(self, *args, **kwargs)
+        finally:
+            self.close()
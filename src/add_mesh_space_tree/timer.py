@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import json
 from time import time
 
 class Timer:
@@ -20,3 +21,96 @@ class Timer:
 		return "\n".join("%-20s: %6.1fs %6.1f"%(keys[i],
 			self.od[keys[i]]-self.od[keys[i-1]],
 			self.od[keys[i]]-self.od[keys[0]]) for i in range(1,len(keys)))
+
+class NoSpan:
+	"a do nothing context manager, returned by NullObserver.span()."
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+class NullObserver:
+	"an observer that ignores everything, used by SCA when no observer is given."
+
+	nospan = NoSpan()
+
+	def span(self, label):
+		return self.nospan
+
+	def generation(self, stats):
+		pass
+
+	def add(self, label):
+		pass
+
+class Span:
+	"context manager that records a timed span in a Profile."
+
+	def __init__(self, profile, label):
+		self.profile = profile
+		self.label = label
+
+	def __enter__(self):
+		self.start = time()
+		self.profile.depth += 1
+		return self
+
+	def __exit__(self, *exc):
+		end = time()
+		self.profile.depth -= 1
+		self.profile.events.append((self.label, self.start, end-self.start, self.profile.depth))
+		return False
+
+class Profile(Timer):
+	"""
+	a Timer that also records nested timing spans and per generation counters.
+
+	It implements the observer interface of SCA (span() and generation()) and can be passed
+	to createGeometry() instead of a Timer. Labeled timestamps added with add() are recorded
+	as spans that started at the previous labeled timestamp.
+	"""
+
+	def __init__(self):
+		Timer.__init__(self)
+		self.start = self.od['Start']
+		self.last = self.start	# the previous labeled timestamp; labels may repeat, so not the last one in od
+		self.depth = 0
+		self.events = []		# (label, start, duration, depth) of each completed span
+		self.generations = []	# one dict of counters per generation
+
+	def add(self, label):
+		Timer.add(self, label)
+		now = self.od[label]
+		self.events.append((label, self.last, now-self.last, self.depth))
+		self.last = now
+
+	def span(self, label):
+		"return a context manager that records the time spent inside it"
+		return Span(self, label)
+
+	def generation(self, stats):
+		"record the counters of a single generation"
+		self.generations.append(dict(stats, time=time()-self.start))
+
+	def asdict(self):
+		return {'spans':[{'name':label, 'start':start-self.start, 'duration':duration, 'depth':depth}
+				for label, start, duration, depth in sorted(self.events, key=lambda e:(e[1],e[3]))],
+			'generations':self.generations}
+
+	def chrometrace(self):
+		"return the spans and counters as a dict in the Chrome trace event format (chrome://tracing)"
+		us = 1e6
+		events = [{'name':label, 'ph':'X', 'pid':0, 'tid':0, 'ts':(start-self.start)*us, 'dur':duration*us}
+			for label, start, duration, depth in self.events]
+		for stats in self.generations:
+			events.append({'name':'generation', 'ph':'C', 'pid':0, 'tid':0, 'ts':stats['time']*us,
+				'args':{k:v for k,v in stats.items() if k not in ('time','generation')}})
+		return {'traceEvents':events, 'displayTimeUnit':'ms'}
+
+	def save(self, filename):
+		"write the profile to filename, in the Chrome trace format if the name ends in .trace.json, as plain JSON otherwise"
+		data = self.chrometrace() if filename.endswith('.trace.json') else self.asdict()
+		with open(filename, 'w') as f:
+			json.dump(data, f, indent=1)
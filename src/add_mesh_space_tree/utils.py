@@ -68,16 +68,32 @@ def load_particlesettings_from_bundled_lib(script_name, library, object_name):
                 return load_particlesettings(fullpath, object_name)
     return None
 
-def get_vertex_group(context, name):
-    """Get a reference to the named vertex group of the active object, creating it if necessary."""
-    ob = context.active_object
+def load_cached(cache, key, collection, loader):
+    """
+    Return a dict name -> datablock in collection for the names remembered in cache[key], calling loader() to
+    (re)load them only if nothing was remembered yet or if any of those datablocks is gone, e.g. because an undo
+    removed it. Only names are cached because datablock references do not survive an undo.
+    If the loader fails or finds nothing an empty dict is returned and nothing is cached, so the next call tries again.
+    """
+    names = cache.get(key)
+    if names is not None and all(name in collection for name in names):
+        return {name:collection[name] for name in names}
+    cache.pop(key, None)
+    try:
+        datablocks = loader()
+    except (OSError, ValueError): # a missing or broken library, or one without the requested datablocks
+        datablocks = None
+    if not datablocks:
+        return {}
+    cache[key] = list(datablocks.keys())
+    return datablocks
+
+def get_vertex_group(ob, name):
+    """Get a reference to the named vertex group of an object, creating it if necessary."""
     if ob is None :
         return None
     if name in ob.vertex_groups:
         return ob.vertex_groups[name]
     else:
-        bpy.ops.object.vertex_group_add()
-        vg = ob.vertex_groups.active
-        vg.name = name
-        return vg
+        return ob.vertex_groups.new(name)
  
\ No newline at end of file